@@ -0,0 +1,113 @@
+from scipy import sparse
+import numpy as np
+
+class SparseLinearApproximator():
+    def __init__(self, n_features=None, alpha=0.1):
+        """
+        Linear value approximator working directly on binary sparse features.
+
+        Has the same ``predict`` / ``partial_fit`` interface as the sklearn regressors
+        used by :class:`RLearning.interfaces.ApproximatedInterface`, but accepts the
+        active feature indices produced by ``TileCoding(output="indices")``.
+        Predicting is a gather-sum over the weights of the active features and
+        fitting is a scatter-add over the same weights.
+
+        Parameters
+        ----------
+        n_features : int or None, optional
+            Total number of features, e.g. ``TileCoding.n_features_out_``.
+            Required when fitting active indices, by default None.
+            When None, inferred from the width of dense or sparse matrices.
+        alpha : float, optional
+            Step-size parameter, by default 0.1.
+            Divided by the number of active features of each sample.
+        """
+        self.n_features = n_features
+        self.alpha = alpha
+
+    def fit(self, X=None, y=None):
+        """
+        Initialize the weights with zeros
+
+        Parameters
+        ----------
+        X : array-like, optional
+            Used to infer the number of features when ``n_features`` is None
+        y : Any, optional
+            Not used, just to provide .fit(X,y) support
+
+        Returns
+        -------
+        self : object
+            Fitted SparseLinearApproximator
+        """
+        n_features = self.n_features
+        if n_features is None:
+            if X is None or self._is_indices(X):
+                raise ValueError("n_features is required when fitting active feature indices")
+            n_features = X.shape[1]
+
+        self.weights = np.zeros( n_features )
+        return self
+
+    def _is_indices(self, X):
+        return isinstance(X, np.ndarray) and np.issubdtype(X.dtype, np.integer)
+
+    def _check_input(self, X):
+        if not sparse.issparse(X):
+            X = np.asarray(X)
+        if not hasattr(self, 'weights'):
+            self.fit(X)
+        return X
+
+    def predict(self, X):
+        """
+        Predict the value of each sample
+
+        Parameters
+        ----------
+        X : array-like of int, shape (n_samples, n_active) or array-like, shape (n_samples, n_features)
+            Active feature indices of each sample, or its dense/sparse feature matrix
+
+        Returns
+        -------
+        ndarray, shape (n_samples,)
+            Predicted values
+        """
+        X = self._check_input(X)
+        if self._is_indices(X):
+            return self.weights[X].sum(axis=1)
+
+        return np.asarray( X @ self.weights ).ravel()
+
+    def partial_fit(self, X, y):
+        """
+        Perform one semi-gradient step towards the targets.
+        The gradient of the whole batch is computed with the current weights and applied at once.
+
+        Parameters
+        ----------
+        X : array-like of int, shape (n_samples, n_active) or array-like, shape (n_samples, n_features)
+            Active feature indices of each sample, or its dense/sparse feature matrix
+        y : array-like, shape (n_samples,)
+            Target values
+
+        Returns
+        -------
+        self : object
+            Updated SparseLinearApproximator
+        """
+        X = self._check_input(X)
+        errors = np.asarray(y, dtype=float) - self.predict(X)
+
+        if self._is_indices(X):
+            step = self.alpha*errors/X.shape[1]
+            if len(X) == 1:
+                self.weights[X[0]] += step[0]
+            else:
+                np.add.at( self.weights, X, step[:, None] )
+            return self
+
+        n_active = np.maximum( np.asarray( (X != 0).sum(axis=1) ).ravel(), 1 )
+        self.weights += np.asarray( X.T @ (self.alpha*errors/n_active) ).ravel()
+        return self
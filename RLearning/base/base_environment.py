@@ -1,10 +1,15 @@
 from abc import ABC, abstractmethod
+from scipy import sparse
 import numpy as np
 
 class BaseEnvironment(ABC):
   """
   Base environment class
   """
+  # Tabular environments over a product of integer ranges may set a
+  # RLearning.state_space.StateSpace, numbering their states arithmetically
+  state_space = None
+
   def __init__(self):
     self.initialize_states()
     self.initialize_actions()
@@ -55,3 +60,161 @@ class BaseEnvironment(ABC):
         Current state reward 
     """
     pass
+
+  def step(self, action):
+    """
+    Take an action, in a single call
+
+    Parameters
+    ----------
+    action : Any
+        Action to be taken
+
+    Returns
+    -------
+    next_state : Any
+        State reached, as returned by ``state()``
+    reward : int or float
+        Reward of the transition
+    done : bool
+        Whether the reached state is terminal
+    """
+    reward = self.reward(action)
+    # Some environments update the terminal flag when the state is read
+    next_state = self.state()
+    return next_state, reward, self.is_terminal()
+
+  def transition_model(self):
+    """
+    Tabular model of the environment, used by :mod:`RLearning.dynamic_programming`.
+    State and action IDs follow the order of ``states`` and ``actions``.
+
+    Returns
+    -------
+    transitions : scipy.sparse.csr_matrix, shape (n_states*n_actions, n_states)
+        Probability of each next state, the row ``state_id*n_actions + action_id``
+        holding the distribution after taking the action on the state.
+        Terminal states have no outgoing transitions, their rows are empty.
+    rewards : ndarray, shape (n_states, n_actions)
+        Expected reward of each (state, action) pair
+    """
+    raise NotImplementedError( "{} has no transition model".format( type(self).__name__ ) )
+
+  def _transition_matrix(self, state_ids, action_ids, next_state_ids, probabilities):
+    """
+    Sparse transition matrix from lists of (state, action, next state, probability),
+    probabilities of repeated entries being summed
+    """
+    n_states, n_actions = len(self.states), len(self.actions)
+    rows = np.asarray(state_ids)*n_actions + np.asarray(action_ids)
+    transitions = sparse.coo_matrix( (probabilities, (rows, next_state_ids)), shape=(n_states*n_actions, n_states) )
+    return transitions.tocsr()
+
+class BaseBatchEnvironment(ABC):
+  """
+  Base batched environment class.
+
+  Holds ``n_envs`` independent episodes as NumPy arrays and advances all of
+  them with a single call to :meth:`step`. Finished episodes are reset
+  automatically, so the batch never contains terminal episodes between steps.
+  """
+  def __init__(self, n_envs=1, seed=None):
+    self.n_envs = n_envs
+    self._rng = np.random.default_rng(seed)
+    self.initialize_states()
+    self.initialize_actions()
+    self.initialize()
+
+  def initialize(self):
+    """
+    Initialize every episode of the batch
+    """
+    self.reset( np.ones( self.n_envs, dtype=bool ) )
+
+  @abstractmethod
+  def reset(self, mask):
+    """
+    Initialize the episodes selected by a boolean mask
+
+    Parameters
+    ----------
+    mask : ndarray of bool, shape (n_envs,)
+        Episodes to be initialized
+    """
+    pass
+
+  @abstractmethod
+  def initialize_states(self):
+    """
+    Initialize the states description (terminal state, state space)
+    """
+    pass
+
+  @abstractmethod
+  def initialize_actions(self):
+    """
+    Initialize all possible actions
+    """
+    pass
+
+  @abstractmethod
+  def state(self):
+    """
+    Return the current state of every episode, shape (n_envs, ...)
+    """
+    pass
+
+  @abstractmethod
+  def _advance(self, action_ids):
+    """
+    Advance every episode one step.
+
+    Parameters
+    ----------
+    action_ids : ndarray of int, shape (n_envs,)
+        Action ID (index of ``self.actions``) taken in each episode
+
+    Returns
+    -------
+    rewards : ndarray, shape (n_envs,)
+        Reward of each episode
+    dones : ndarray of bool, shape (n_envs,)
+        Whether each episode reached a terminal state
+    """
+    pass
+
+  def _terminal_states(self, states, dones):
+    """
+    Replace the states of finished episodes by the terminal state
+    """
+    states = states.copy()
+    states[dones] = self.terminal_state
+    return states
+
+  def step(self, action_ids):
+    """
+    Advance all the episodes one step and reset the finished ones.
+
+    Parameters
+    ----------
+    action_ids : array-like of int, shape (n_envs,)
+        Action ID (index of ``self.actions``) taken in each episode
+
+    Returns
+    -------
+    next_states : ndarray, shape (n_envs, ...)
+        States reached by the actions, the terminal state for finished episodes.
+        After the call, :meth:`state` already returns the new initial states.
+    rewards : ndarray, shape (n_envs,)
+        Reward of each episode
+    dones : ndarray of bool, shape (n_envs,)
+        Whether each episode has ended in this step
+    """
+    action_ids = np.asarray(action_ids)
+    rewards, dones = self._advance(action_ids)
+    next_states = self._terminal_states( self.state(), dones )
+
+    if dones.any():
+      self.reset(dones)
+
+    return next_states, rewards, dones
@@ -2,14 +2,45 @@ from abc import ABC, abstractmethod
 import numpy as np
 
 class BaseMethod(ABC):
-    def __init__(self, episodes=1, discount=1.0):
+    def __init__(self, episodes=1, discount=1.0, instrumentation=None):
+        """
+        Parameters
+        ----------
+        episodes : int, optional
+            Number of episodes simulated by fit, by default 1
+        discount : float, optional
+            Discount factor, by default 1.0
+        instrumentation : RLearning.instrumentation.Instrumentation or None, optional
+            Collects per-episode counters and timers during fit, by default None
+        """
         self.episodes = episodes
         self.discount = discount
+        self.instrumentation = instrumentation
 
-    def fit(self, interface):
-        for episode in range( self.episodes ):
-            interface.initialize_envrioment()
-            self.simulate()
+    def fit(self, environment):
+        self.env_interface.fit( environment )
+        self._run_episodes()
+
+    def _run_episodes(self):
+        """
+        Simulate all the episodes, going through the instrumentation when given
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            for episode in range( self.episodes ):
+                self.env_interface.initialize_environment()
+                self.simulate()
+            return
+
+        instrumentation.attach( self )
+        try:
+            for episode in range( self.episodes ):
+                instrumentation.start_episode()
+                self.env_interface.initialize_environment()
+                self.simulate()
+                instrumentation.end_episode( self )
+        finally:
+            instrumentation.detach()
 
     @abstractmethod
     def simulate(self):
@@ -20,4 +51,4 @@ class BaseMethod(ABC):
 
     @abstractmethod
     def action(self, state_id):
-        pass
\ No newline at end of file
+        pass
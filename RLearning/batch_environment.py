@@ -0,0 +1,249 @@
+from RLearning.base.base_environment import BaseBatchEnvironment
+from RLearning.environment import STICK, HIT
+import numpy as np
+
+class BatchKBanditsProblem(BaseBatchEnvironment):
+  """
+  Batched version of :class:`RLearning.environment.KBanditsProblem`.
+  Every episode ends after a single step.
+  """
+  def reset(self, mask):
+    pass
+
+  def initialize_states(self):
+    self.states = ['START']
+    self.terminal_state = 'END'
+    self.states.append( self.terminal_state )
+
+  def initialize_actions(self):
+    self.actions = [0, 1, 2, 3]
+
+  def state(self):
+    return np.full( self.n_envs, 'START' )
+
+  def _advance(self, action_ids):
+    means = np.array( self.actions, dtype=float )[action_ids]
+    rewards = self._rng.normal( loc=means )
+
+    return rewards, np.ones( self.n_envs, dtype=bool )
+
+class BatchRandomDiscreteWalk(BaseBatchEnvironment):
+  """
+  Batched version of :class:`RLearning.environment.RandomDiscreteWalk`.
+  """
+  def __init__(self, n_states=2, step_size=1, n_envs=1, seed=None):
+    self.n_states = n_states
+    self.step_size = step_size
+    super(BatchRandomDiscreteWalk, self).__init__(n_envs=n_envs, seed=seed)
+
+  def reset(self, mask):
+    if not hasattr(self, '_position'):
+      self._position = np.zeros( self.n_envs, dtype=int )
+    self._position[mask] = self.n_states//2 # Starts on 'C'
+
+  def initialize_states(self):
+    self.states = [ i for i in range(self.n_states) ]
+    self.terminal_state = -1
+    self.states.append( self.terminal_state )
+
+  def initialize_actions(self):
+    self.actions = ['NONE']
+
+  def state(self):
+    return self._position.copy()
+
+  def _advance(self, action_ids):
+    self._position += self._rng.integers( -self.step_size, self.step_size+1, size=self.n_envs )
+
+    rewards = np.zeros( self.n_envs )
+    rewards[ self._position < 0 ] = -1
+    rewards[ self._position >= self.n_states ] = 1
+
+    return rewards, rewards != 0
+
+class BatchWindyGridWorld(BaseBatchEnvironment):
+  """
+  Batched version of :class:`RLearning.environment.WindyGridWorld`.
+  States are rows ``(line, column)`` of an array with shape (n_envs, 2).
+  """
+  def reset(self, mask):
+    if not hasattr(self, '_player_position'):
+      self._player_position = np.zeros( (self.n_envs, 2), dtype=int )
+    self._player_position[mask] = self._start_point
+
+  def initialize_states(self):
+    self._n_lines = 7
+    self._n_columns = 10
+
+    self._start_point = (3, 0)
+    self._end_point = (3, 7)
+
+    self._columns_wind = np.array( [0,0,0,1,1,1,2,2,1,0] )
+
+    self.terminal_state = (-1, -1)
+
+  def initialize_actions(self):
+    self.actions = [(+1, 0), (-1, 0), (0,+1), (0,-1)]
+    self._actions_array = np.array( self.actions )
+
+  def state(self):
+    return self._player_position.copy()
+
+  def _advance(self, action_ids):
+    action = self._actions_array[action_ids]
+
+    col_pos = np.clip( self._player_position[:,1]+action[:,1], 0, self._n_columns-1 )
+    lin_pos = np.clip( self._player_position[:,0]+action[:,0]+self._columns_wind[col_pos], 0, self._n_lines-1 )
+
+    dones = np.all( self._player_position == self._end_point, axis=1 )
+    rewards = np.where( dones, 1, -1 )
+
+    self._player_position[~dones, 0] = lin_pos[~dones]
+    self._player_position[~dones, 1] = col_pos[~dones]
+
+    return rewards, dones
+
+class BatchSimplifiedBlackjack(BaseBatchEnvironment):
+  """
+  Batched version of :class:`RLearning.environment.SimplifiedBlackjack`.
+  States are rows ``(player_sum, dealer_card_up, usable_ace)`` of an array with shape (n_envs, 3).
+  """
+  def __init__(self, exploring_starts=True, n_envs=1, seed=None):
+    self._exploring_starts = exploring_starts
+    super(BatchSimplifiedBlackjack, self).__init__(n_envs=n_envs, seed=seed)
+
+  def draw(self, size):
+    card = self._rng.integers( 1, 13+1, size=size ) ## Infinite deck
+    return np.minimum( card, 10 )
+
+  def sum_card_and_update_usable_aces( self, total, card, usable_aces ):
+    ace_as_eleven = (card == 1) & (total+11 <= 21)
+    total = np.where( ace_as_eleven, total+11, total+card )
+    usable_aces = usable_aces + ace_as_eleven
+
+    soften = ~ace_as_eleven & (total > 21) & (usable_aces > 0)
+    total = np.where( soften, total-10, total )
+    usable_aces = np.where( soften, usable_aces-1, usable_aces )
+    return total, usable_aces
+
+  def reset(self, mask):
+    if not hasattr(self, 'player_sum'):
+      self.dealer_card_up = np.zeros( self.n_envs, dtype=int )
+      self.player_sum = np.zeros( self.n_envs, dtype=int )
+      self.player_usable_aces = np.zeros( self.n_envs, dtype=int )
+
+    n_resets = int( mask.sum() )
+    self.dealer_card_up[mask] = self.draw( n_resets )
+
+    if self._exploring_starts:
+      self.player_sum[mask] = self._rng.integers( 12, 21+1, size=n_resets )
+      self.player_usable_aces[mask] = self._rng.integers( 0, 1+1, size=n_resets )
+      return
+
+    player_sum = np.zeros( n_resets, dtype=int )
+    usable_aces = np.zeros( n_resets, dtype=int )
+    drawing = player_sum < 12
+    while drawing.any():
+      player_sum[drawing], usable_aces[drawing] = self.sum_card_and_update_usable_aces( player_sum[drawing],
+                                                                                       self.draw( int(drawing.sum()) ),
+                                                                                       usable_aces[drawing]
+                                                                                     )
+      drawing = player_sum < 12
+
+    self.player_sum[mask] = player_sum
+    self.player_usable_aces[mask] = usable_aces
+
+  def initialize_states(self):
+    self.terminal_state = (-1,-1,-1)
+
+  def initialize_actions(self):
+    self.actions = [ STICK, HIT ]
+
+  def dealer_turn(self, dealer_card_up):
+    dealer_sum, dealer_usable_aces = self.sum_card_and_update_usable_aces( np.zeros_like(dealer_card_up),
+                                                                          dealer_card_up,
+                                                                          np.zeros_like(dealer_card_up)
+                                                                        )
+    drawing = dealer_sum < 17
+    while drawing.any():
+      dealer_sum[drawing], dealer_usable_aces[drawing] = self.sum_card_and_update_usable_aces( dealer_sum[drawing],
+                                                                                             self.draw( int(drawing.sum()) ),
+                                                                                             dealer_usable_aces[drawing]
+                                                                                           )
+      drawing = dealer_sum < 17
+
+    return dealer_sum
+
+  def state(self):
+    player_has_usable_ace = (self.player_usable_aces > 0).astype(int)
+    return np.stack( (self.player_sum, self.dealer_card_up, player_has_usable_ace), axis=1 )
+
+  def _advance(self, action_ids):
+    action = np.array( self.actions )[action_ids]
+    rewards = np.zeros( self.n_envs, dtype=int )
+    dones = np.zeros( self.n_envs, dtype=bool )
+
+    # Stick
+    stick = action == STICK
+    if stick.any():
+      dealer_sum = self.dealer_turn( self.dealer_card_up[stick] )
+      rewards[stick] = np.where( dealer_sum > 21, 1, np.sign( self.player_sum[stick]-dealer_sum ) )
+      dones[stick] = True
+
+    # Hit
+    hit = ~stick
+    if hit.any():
+      self.player_sum[hit], self.player_usable_aces[hit] = self.sum_card_and_update_usable_aces( self.player_sum[hit],
+                                                                                               self.draw( int(hit.sum()) ),
+                                                                                               self.player_usable_aces[hit]
+                                                                                             )
+      player_sum = self.player_sum[hit]
+      rewards[hit] = np.where( player_sum > 21, -1, np.where( player_sum < 21, 0, 1 ) )
+      dones[hit] = player_sum >= 21
+
+    return rewards, dones
+
+class BatchMontainCar(BaseBatchEnvironment):
+  """
+  Batched version of :class:`RLearning.environment.MontainCar`.
+  States are rows ``(position, velocity)`` of an array with shape (n_envs, 2),
+  ready to be transformed at once by the feature extractors.
+  As in the single car version, a car ends its episode on the step taken
+  after reaching the goal, and the reached state is kept as its next state.
+  """
+  def reset(self, mask):
+    if not hasattr(self, '_position'):
+      self._position = np.zeros( self.n_envs )
+      self._velocity = np.zeros( self.n_envs )
+
+    self._position[mask] = self._rng.uniform( -0.6, -0.4, size=int( mask.sum() ) )
+    self._velocity[mask] = 0
+
+  def initialize_actions(self):
+    # Full throttle, Reverse throttle, zero 
+    self.actions = [+1, -1, 0]
+    self._actions_array = np.array( self.actions, dtype=float )
+
+  def initialize_states(self):
+    pass
+
+  def state(self):
+    return np.stack( (self._position, self._velocity), axis=1 )
+
+  def _terminal_states(self, states, dones):
+    # Continuous states, there is no terminal state to stand for the finished cars
+    return states
+
+  def _advance(self, action_ids):
+    dones = self._position >= 0.5
+    rewards = np.where( dones, 1, -1 )
+
+    action = self._actions_array[action_ids]
+    velocity = self._velocity + 0.001*action - 0.0025*np.cos( 3*self._position )
+    np.clip( velocity, -0.07, 0.07, out=self._velocity )
+
+    self._position += self._velocity
+    np.clip( self._position, -1.200001, 0.51, out=self._position )
+    self._velocity[ self._position <= -1.2 ] = 0
+
+    return rewards, dones
@@ -0,0 +1,256 @@
+from scipy.signal import lfilter
+import numpy as np
+
+def discounted_returns(rewards, discount=1.0):
+    """
+    Discounted return of every time step of an episode, computed with a single reverse scan.
+    :math:`G_t = R_{t} + \\gamma G_{t+1}`
+
+    Parameters
+    ----------
+    rewards : array-like, shape (n_steps,)
+        Rewards of the episode, in time order
+    discount : float, optional
+        Discount factor, by default 1.0
+
+    Returns
+    -------
+    ndarray, shape (n_steps,)
+        Return of each time step
+    """
+    rewards = np.asarray(rewards, dtype=float)
+    if len(rewards) == 0:
+        return rewards
+
+    return lfilter( [1.0], [1.0, -discount], rewards[::-1] )[::-1]
+
+class TrajectoryBuffer():
+    def __init__(self, capacity=64):
+        """
+        Episode buffer backed by preallocated arrays of states, actions and rewards.
+        The arrays are allocated on the first append, following the shape and type of
+        the first transition, and double their capacity when full.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Initial number of time steps, by default 64
+        """
+        self._capacity = capacity
+        self._size = 0
+        self._states = None
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._size = 0
+
+    def _allocate(self, state, action):
+        state = np.asarray(state)
+        action = np.asarray(action)
+        self._states = np.empty( (self._capacity,)+state.shape, dtype=state.dtype )
+        self._actions = np.empty( (self._capacity,)+action.shape, dtype=action.dtype )
+        self._rewards = np.empty( self._capacity, dtype=float )
+
+    def _grow(self):
+        self._capacity *= 2
+        self._states = np.resize( self._states, (self._capacity,)+self._states.shape[1:] )
+        self._actions = np.resize( self._actions, (self._capacity,)+self._actions.shape[1:] )
+        self._rewards = np.resize( self._rewards, self._capacity )
+
+    def append(self, state, action, reward):
+        if self._states is None:
+            self._allocate(state, action)
+        if self._size == self._capacity:
+            self._grow()
+
+        self._states[self._size] = state
+        self._actions[self._size] = action
+        self._rewards[self._size] = reward
+        self._size += 1
+
+    @property
+    def states(self):
+        if self._states is None:
+            return np.empty(0)
+        return self._states[:self._size]
+
+    @property
+    def actions(self):
+        if self._states is None:
+            return np.empty(0)
+        return self._actions[:self._size]
+
+    @property
+    def rewards(self):
+        if self._states is None:
+            return np.empty(0)
+        return self._rewards[:self._size]
+
+class NStepBuffer():
+    def __init__(self, n_steps, discount=1.0):
+        """
+        Circular buffer holding the last ``n_steps`` transitions of an episode.
+
+        Pushing and popping only move a head pointer, and the discounted sum of the
+        buffered rewards is kept up to date in O(1): the ring is split in the rewards
+        written in the current pass over its slots (accumulated as a prefix sum) and
+        the ones left from the previous pass (suffix sums, computed once per pass).
+        States and actions are kept as given, so both tabular IDs and vector states work.
+
+        Parameters
+        ----------
+        n_steps : int
+            Number of transitions held by the buffer
+        discount : float, optional
+            Discount factor, by default 1.0
+        """
+        self.n_steps = n_steps
+        self.discount = discount
+        self._discounts = discount**np.arange( n_steps+1, dtype=float )
+        self.clear()
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+        self._states = [ None ]*self.n_steps
+        self._actions = [ None ]*self.n_steps
+        self._rewards = np.zeros( self.n_steps )
+        self._samplings = np.ones( self.n_steps )
+
+        self._prefix_sum = 0.0
+        self._suffix_sums = np.zeros( self.n_steps )
+
+    def __len__(self):
+        return self._size
+
+    def is_full(self):
+        return self._size == self.n_steps
+
+    def push(self, state, action, reward, sampling=1.0):
+        position = (self._head+self._size)%self.n_steps
+        self._states[position] = state
+        self._actions[position] = action
+        self._rewards[position] = reward
+        self._samplings[position] = sampling
+        self._size += 1
+
+        self._prefix_sum += self._discounts[position]*reward
+        if position == self.n_steps-1:
+            # The pass over the slots is complete
+            self._suffix_sums = discounted_returns( self._rewards, self.discount )
+            self._prefix_sum = 0.0
+
+    def pop(self):
+        self._states[self._head] = None
+        self._actions[self._head] = None
+        self._head = (self._head+1)%self.n_steps
+        self._size -= 1
+
+    def oldest(self):
+        return self._states[self._head], self._actions[self._head]
+
+    def discounted_reward_sum(self):
+        """
+        Discounted sum of the buffered rewards, from the oldest to the newest.
+        O(1) when the buffer is full.
+        """
+        if not self.is_full():
+            positions = (self._head+np.arange( self._size ))%self.n_steps
+            return np.dot( self._discounts[:self._size], self._rewards[positions] )
+
+        head = self._head
+        return self._suffix_sums[head] + self._discounts[self.n_steps-head]*self._prefix_sum
+
+    def ordered(self):
+        """
+        Buffered transitions, from the oldest to the newest.
+
+        Returns
+        -------
+        states, actions : list
+        rewards, samplings : ndarray
+        """
+        positions = (self._head+np.arange( self._size ))%self.n_steps
+        states = [ self._states[position] for position in positions ]
+        actions = [ self._actions[position] for position in positions ]
+        return states, actions, self._rewards[positions], self._samplings[positions]
+
+class ReplayBuffer():
+    def __init__(self, capacity=10000):
+        """
+        Experience replay memory, a circular buffer of transitions backed by preallocated arrays
+        of states, actions, rewards, next states and done flags. The arrays are allocated on
+        the first push, following the shape and type of the first transition, and the oldest
+        transitions are overwritten once the buffer is full.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of transitions held, by default 10000
+        """
+        self.capacity = capacity
+        self.clear()
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._position = 0
+        self._size = 0
+        self._states = None
+
+    def is_full(self):
+        return self._size == self.capacity
+
+    def _allocate(self, state, action):
+        state = np.asarray(state)
+        action = np.asarray(action)
+        self._states = np.empty( (self.capacity,)+state.shape, dtype=state.dtype )
+        self._actions = np.empty( (self.capacity,)+action.shape, dtype=action.dtype )
+        self._rewards = np.empty( self.capacity, dtype=float )
+        self._next_states = np.empty( (self.capacity,)+state.shape, dtype=state.dtype )
+        self._dones = np.empty( self.capacity, dtype=bool )
+
+    def push(self, state, action, reward, next_state, done):
+        if self._states is None:
+            self._allocate(state, action)
+
+        position = self._position
+        self._states[position] = state
+        self._actions[position] = action
+        self._rewards[position] = reward
+        self._next_states[position] = next_state
+        self._dones[position] = done
+
+        self._position = (position+1)%self.capacity
+        self._size = min( self._size+1, self.capacity )
+
+    def sample(self, batch_size, replace=True):
+        """
+        Uniform random minibatch of the stored transitions
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of transitions
+        replace : bool, optional
+            Whether a transition can be drawn more than once, by default True.
+            Sampling with replacement is cheaper, without it batch_size can not exceed the size.
+
+        Returns
+        -------
+        states, actions, rewards, next_states, dones : ndarray
+            Arrays with the transitions as rows, of length batch_size
+        """
+        if self._size == 0:
+            raise ValueError("Can not sample from an empty ReplayBuffer")
+
+        if replace:
+            indices = np.random.randint( 0, self._size, size=batch_size )
+        else:
+            indices = np.random.choice( self._size, size=batch_size, replace=False )
+
+        return ( self._states[indices], self._actions[indices], self._rewards[indices],
+                 self._next_states[indices], self._dones[indices] )
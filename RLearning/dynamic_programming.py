@@ -0,0 +1,196 @@
+import warnings
+
+from scipy import sparse
+from scipy.sparse.linalg import spsolve, MatrixRankWarning
+import numpy as np
+
+def _check_model(transitions, rewards):
+    """
+    Transitions as a CSR matrix of shape (n_states*n_actions, n_states),
+    also accepting a dense array of shape (n_states, n_actions, n_states)
+    """
+    rewards = np.asarray(rewards, dtype=float)
+    n_states, n_actions = rewards.shape
+
+    if not sparse.issparse(transitions):
+        transitions = np.asarray(transitions, dtype=float).reshape( n_states*n_actions, n_states )
+    transitions = sparse.csr_matrix(transitions)
+    return transitions, rewards
+
+def _policy_probabilities(policy, n_states, n_actions):
+    policy = np.asarray(policy)
+    if policy.ndim == 2:
+        return policy.astype(float)
+
+    probabilities = np.zeros( (n_states, n_actions) )
+    probabilities[ np.arange(n_states), policy ] = 1.0
+    return probabilities
+
+def action_values(transitions, rewards, values, discount=1.0):
+    """
+    Action values of a state value function, :math:`q(s,a) = r(s,a) + \\gamma \\sum_{s'} p(s'|s,a) v(s')`
+
+    Parameters
+    ----------
+    transitions : scipy.sparse matrix, shape (n_states*n_actions, n_states) or array-like, shape (n_states, n_actions, n_states)
+        Next state probabilities, as returned by ``environment.transition_model()``
+    rewards : array-like, shape (n_states, n_actions)
+        Expected reward of each (state, action) pair
+    values : array-like, shape (n_states,)
+        State values
+    discount : float, optional
+        Discount factor, by default 1.0
+
+    Returns
+    -------
+    ndarray, shape (n_states, n_actions)
+    """
+    transitions, rewards = _check_model(transitions, rewards)
+    return rewards + discount*( transitions @ np.asarray(values, dtype=float) ).reshape( rewards.shape )
+
+def greedy_policy(transitions, rewards, values, discount=1.0):
+    """
+    Greedy action of each state w.r.t. the state values, ties going to the lowest action ID
+    """
+    return np.argmax( action_values(transitions, rewards, values, discount), axis=1 )
+
+def policy_evaluation(transitions, rewards, policy, discount=1.0, method="direct", tol=1e-8, max_iter=10000):
+    """
+    State values of a policy.
+
+    Parameters
+    ----------
+    transitions : scipy.sparse matrix, shape (n_states*n_actions, n_states) or array-like, shape (n_states, n_actions, n_states)
+        Next state probabilities, as returned by ``environment.transition_model()``
+    rewards : array-like, shape (n_states, n_actions)
+        Expected reward of each (state, action) pair
+    policy : array-like of int, shape (n_states,) or array-like, shape (n_states, n_actions)
+        Action ID of each state, or the probability of each action on each state
+    discount : float, optional
+        Discount factor, by default 1.0
+    method : str, optional
+        "direct" solves the sparse linear system :math:`(I-\\gamma P_\\pi) v = r_\\pi`,
+        "iterative" applies the Bellman expectation operator until convergence, by default "direct"
+    tol : float, optional
+        Largest value change at convergence of the "iterative" method, by default 1e-8
+    max_iter : int, optional
+        Maximum number of sweeps of the "iterative" method, by default 10000
+
+    Returns
+    -------
+    ndarray, shape (n_states,)
+    """
+    transitions, rewards = _check_model(transitions, rewards)
+    n_states, n_actions = rewards.shape
+    probabilities = _policy_probabilities(policy, n_states, n_actions)
+
+    # Transitions and rewards of the Markov chain followed by the policy
+    weights = sparse.csr_matrix( ( probabilities.ravel(),
+                                   ( np.repeat( np.arange(n_states), n_actions ), np.arange(n_states*n_actions) ) ),
+                                 shape=(n_states, n_states*n_actions) )
+    policy_transitions = weights @ transitions
+    policy_rewards = (probabilities*rewards).sum(axis=1)
+
+    if method == "direct":
+        system = sparse.identity( n_states, format="csc" ) - discount*policy_transitions.tocsc()
+        with warnings.catch_warnings():
+            # A singular system is reported below
+            warnings.simplefilter( "ignore", MatrixRankWarning )
+            values = np.atleast_1d( spsolve( system, policy_rewards ) )
+        if not np.all( np.isfinite(values) ):
+            raise ValueError("The policy values are unbounded, some states never reach a terminal state. "
+                             "Use a discount smaller than 1.0 or a policy that ends the episodes.")
+        return values
+
+    if method != "iterative":
+        raise ValueError("method should be 'direct' or 'iterative'")
+
+    values = np.zeros( n_states )
+    for iteration in range( max_iter ):
+        new_values = policy_rewards + discount*( policy_transitions @ values )
+        converged = np.max( np.abs(new_values-values) ) < tol
+        values = new_values
+        if converged:
+            break
+    return values
+
+def value_iteration(transitions, rewards, discount=1.0, tol=1e-8, max_iter=10000, values=None):
+    """
+    Optimal state values and a greedy optimal policy, by value iteration.
+    Each sweep is a single sparse matrix-vector product over all the (state, action) pairs.
+
+    Parameters
+    ----------
+    transitions : scipy.sparse matrix, shape (n_states*n_actions, n_states) or array-like, shape (n_states, n_actions, n_states)
+        Next state probabilities, as returned by ``environment.transition_model()``
+    rewards : array-like, shape (n_states, n_actions)
+        Expected reward of each (state, action) pair
+    discount : float, optional
+        Discount factor, by default 1.0
+    tol : float, optional
+        Largest value change at convergence, by default 1e-8
+    max_iter : int, optional
+        Maximum number of sweeps, by default 10000
+    values : array-like, shape (n_states,) or None, optional
+        Initial state values, by default None (zeros)
+
+    Returns
+    -------
+    values : ndarray, shape (n_states,)
+    policy : ndarray of int, shape (n_states,)
+    """
+    transitions, rewards = _check_model(transitions, rewards)
+    n_states, n_actions = rewards.shape
+    values = np.zeros( n_states ) if values is None else np.array( values, dtype=float )
+
+    for iteration in range( max_iter ):
+        q_values = rewards + discount*( transitions @ values ).reshape( n_states, n_actions )
+        new_values = q_values.max(axis=1)
+        converged = np.max( np.abs(new_values-values) ) < tol
+        values = new_values
+        if converged:
+            break
+
+    return values, greedy_policy(transitions, rewards, values, discount)
+
+def policy_iteration(transitions, rewards, discount=1.0, policy=None, method="direct", max_iter=1000):
+    """
+    Optimal state values and policy, by policy iteration.
+
+    Parameters
+    ----------
+    transitions : scipy.sparse matrix, shape (n_states*n_actions, n_states) or array-like, shape (n_states, n_actions, n_states)
+        Next state probabilities, as returned by ``environment.transition_model()``
+    rewards : array-like, shape (n_states, n_actions)
+        Expected reward of each (state, action) pair
+    discount : float, optional
+        Discount factor, by default 1.0
+    policy : array-like of int, shape (n_states,) or None, optional
+        Initial policy, by default None (the first action on every state).
+        With a discount of 1.0, it must end the episodes from every state.
+    method : str, optional
+        Policy evaluation method, see :func:`policy_evaluation`, by default "direct"
+    max_iter : int, optional
+        Maximum number of improvement steps, by default 1000
+
+    Returns
+    -------
+    values : ndarray, shape (n_states,)
+    policy : ndarray of int, shape (n_states,)
+    """
+    transitions, rewards = _check_model(transitions, rewards)
+    n_states, n_actions = rewards.shape
+    policy = np.zeros( n_states, dtype=int ) if policy is None else np.array( policy, dtype=int )
+
+    for iteration in range( max_iter ):
+        values = policy_evaluation( transitions, rewards, policy, discount, method=method )
+        q_values = action_values( transitions, rewards, values, discount )
+
+        # Keeping the current action on ties avoids cycling between equivalent policies
+        current = q_values[ np.arange(n_states), policy ]
+        improvable = q_values.max(axis=1) > current + 1e-12*np.maximum( 1, np.abs(current) )
+        if not np.any( improvable ):
+            break
+        policy[improvable] = np.argmax( q_values[improvable], axis=1 )
+
+    return values, policy
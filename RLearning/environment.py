@@ -1,7 +1,8 @@
 from RLearning.base.base_environment import BaseEnvironment
+from RLearning.state_space import StateSpace
 import random
-import itertools
 import numpy as np
+from scipy.linalg import solve_banded
 
 class KBanditsProblem(BaseEnvironment):
   def initialize(self):
@@ -33,6 +34,14 @@ class KBanditsProblem(BaseEnvironment):
 
     return all_rewards[action]
 
+  def transition_model(self):
+    n_actions = len(self.actions)
+    transitions = self._transition_matrix( np.zeros(n_actions, dtype=int), np.arange(n_actions),
+                                           np.ones(n_actions, dtype=int), np.ones(n_actions) )
+    rewards = np.zeros( (len(self.states), n_actions) )
+    rewards[0] = self.actions # Each arm pays a normal reward centered on its index
+    return transitions, rewards
+
 class Random1000StateWalk(BaseEnvironment):
   def initialize(self):
     self._position = 500 # Starts on 'C'
@@ -69,6 +78,29 @@ class Random1000StateWalk(BaseEnvironment):
 
     return 0
   
+# True state values of the random walks, by (n_states, step_size)
+_random_walk_solutions = {}
+
+def _solve_random_walk(n_states, k):
+  """
+  Solves the Bellman equations of the walk, :math:`v(s) = \\frac{1}{2k} \\sum_{0<|d|\\leq k} v(s+d)`,
+  with -1 and 1 for leaving through the left and right sides. The system has bandwidth k,
+  so it is solved in O(n k^2) time and O(n k) memory.
+  """
+  # Constant diagonals, row k-d of the banded form holding the offset d
+  banded = np.full( (2*k+1, n_states), 1.0/(2*k) )
+  banded[k] = -1
+
+  lines = np.arange(n_states)
+  inde_vector = np.maximum(0, k-lines)/(2*k) - np.maximum(0, k-(n_states-1-lines))/(2*k)
+
+  true_state_values = solve_banded( (k, k), banded, inde_vector )
+
+  # Appending terminal state
+  true_state_values = np.hstack( (true_state_values, [0]) )
+  true_state_values.setflags( write=False )
+  return true_state_values
+
 class RandomDiscreteWalk( BaseEnvironment ):
   def __init__( self, n_states=2, step_size=1):
     self.n_states = n_states
@@ -79,35 +111,47 @@ class RandomDiscreteWalk( BaseEnvironment ):
     self._position = self.n_states//2 # Starts on 'C'
     self._reach_terminal = False
 
-    self.compute_true_solution()
-
   def initialize_states(self):
-    self.states = [ i for i in range(self.n_states) ]
     self.terminal_state = -1
-    self.states.append( self.terminal_state )
+    self.state_space = StateSpace( range(self.n_states), [self.terminal_state] )
+    self.states = self.state_space.states()
 
   def initialize_actions(self):
     self.actions = ['NONE']
 
   def compute_true_solution(self):
+    """
+    True value of each state, the terminal state included (with value 0).
+    Solved once per (n_states, step_size) and shared by all the walks with the same
+    parameters, the returned array is read-only.
+    """
+    key = ( self.n_states, self.step_size )
+    if key not in _random_walk_solutions:
+      _random_walk_solutions[key] = _solve_random_walk( *key )
+
+    return _random_walk_solutions[key]
+
+  @property
+  def true_state_values(self):
+    return self.compute_true_solution()
+
+  def transition_model(self):
     n_states = self.n_states
     k = self.step_size
 
-    coef_matrix = np.zeros( (n_states,n_states) )
-    inde_vector =  np.zeros( (n_states,) )
-    coef_aux = [ -1 if i==0 else 1.0/(2*k) for i in np.arange( -k, k+1 ) ]
-    coef_aux
-
-    for line in range(n_states):
-        coef_matrix[line][max(0,line-k):min(n_states,line+k+1)] = coef_aux[max(0,k-line):k+1+min(k,n_states-1-line)]
-        inde_vector[line] = -1*max(0,k-line)*(-1)/(2*k) - 1*max(0, k-(n_states-1-line))*(1)/(2*k)
+    # Every step in [-k, k] is equally likely, leaving the walk through either side ends the episode
+    positions = np.repeat( np.arange(n_states), 2*k+1 )
+    next_positions = positions + np.tile( np.arange(-k, k+1), n_states )
+    outside = (next_positions < 0) | (next_positions >= n_states)
+    next_state_ids = np.where( outside, n_states, next_positions )
 
-    self.true_state_values = np.linalg.solve( coef_matrix, inde_vector )
+    transitions = self._transition_matrix( positions, np.zeros_like(positions), next_state_ids,
+                                           np.full( len(positions), 1.0/(2*k+1) ) )
 
-    # Appending terminal state
-    self.true_state_values = np.hstack( (self.true_state_values, [0]) )
-
-    return self.true_state_values
+    step_rewards = (next_positions >= n_states).astype(float) - (next_positions < 0)
+    rewards = np.zeros( (n_states+1, 1) )
+    rewards[:n_states, 0] = step_rewards.reshape(n_states, 2*k+1).mean(axis=1)
+    return transitions, rewards
 
   def state(self):
     self._reach_terminal=self._position<0 or self._position>=self.n_states
@@ -148,9 +192,9 @@ class WindyGridWorld(BaseEnvironment):
     
     self._columns_wind = [0,0,0,1,1,1,2,2,1,0]
 
-    self.states = list( itertools.product( range(self._n_lines), range(self._n_columns) ) )
     self.terminal_state = (-1, -1)
-    self.states.append( self.terminal_state )
+    self.state_space = StateSpace( [ range(self._n_lines), range(self._n_columns) ], [self.terminal_state] )
+    self.states = self.state_space.states()
 
   def initialize_actions(self):
     self.actions = [(+1, 0), (-1, 0), (0,+1), (0,-1)]
@@ -182,6 +226,31 @@ class WindyGridWorld(BaseEnvironment):
 
     return -1
 
+  def transition_model(self):
+    state_to_id = { state:id for id,state in enumerate(self.states) }
+    terminal_id = state_to_id[ self.terminal_state ]
+    state_ids, action_ids, next_state_ids = [], [], []
+    rewards = np.zeros( (len(self.states), len(self.actions)) )
+
+    for state in self.states[:-1]:
+      for action_id, action in enumerate(self.actions):
+        state_ids.append( state_to_id[state] )
+        action_ids.append( action_id )
+
+        if state == self._end_point:
+          # The episode ends on the step taken from the goal
+          next_state_ids.append( terminal_id )
+          rewards[ state_to_id[state], action_id ] = 1
+          continue
+
+        col_pos = max(0, min(state[1]+action[1], self._n_columns-1))
+        lin_pos = max(0, min(state[0]+action[0]+self._wind(col_pos), self._n_lines-1))
+        next_state_ids.append( state_to_id[ (lin_pos, col_pos) ] )
+        rewards[ state_to_id[state], action_id ] = -1
+
+    transitions = self._transition_matrix( state_ids, action_ids, next_state_ids, np.ones(len(state_ids)) )
+    return transitions, rewards
+
   def is_terminal(self):
     return not self._player_in_game
 
@@ -240,14 +309,13 @@ class SimplifiedBlackjack(BaseEnvironment):
     self.initialize_default_start()
 
   def initialize_states(self):
-    player_sum = [ i for i in range(12, 21+1) ]
-    dealer_showing_card = [ i for i in range(1, 10+1) ]
-    has_ace = [ 1, 0 ]
+    player_sum = range(12, 21+1)
+    dealer_showing_card = range(1, 10+1)
+    has_ace = range(1, -1, -1)
 
-    self.states = itertools.product( player_sum, dealer_showing_card, has_ace )
-    self.states = list(self.states)
     self.terminal_state = (-1,-1,-1)
-    self.states.append( self.terminal_state )
+    self.state_space = StateSpace( [ player_sum, dealer_showing_card, has_ace ], [self.terminal_state] )
+    self.states = self.state_space.states()
 
   def initialize_actions(self):
     self.actions = [ STICK, HIT ]
@@ -312,6 +380,75 @@ class SimplifiedBlackjack(BaseEnvironment):
   def is_terminal(self):
     return not self._player_in_game
 
+  def _card_probabilities(self):
+    # Infinite deck, face cards count as 10
+    return { card: (4 if card == 10 else 1)/13 for card in range(1, 10+1) }
+
+  def dealer_distribution(self, dealer_card_up):
+    """
+    Probability of each final sum of the dealer, given the card showing.
+
+    Returns
+    -------
+    dict
+        Final sum (17 to 21, or 22 for any burst) to its probability
+    """
+    card_probabilities = self._card_probabilities()
+    memory = {}
+
+    def final_sums(dealer_sum, dealer_usable_aces):
+      if dealer_sum >= 17:
+        return { min(dealer_sum, 22): 1.0 }
+      if (dealer_sum, dealer_usable_aces) in memory:
+        return memory[ (dealer_sum, dealer_usable_aces) ]
+
+      distribution = {}
+      for card, probability in card_probabilities.items():
+        next_sum = self.sum_card_and_update_usable_aces( dealer_sum, card, dealer_usable_aces )
+        for final_sum, final_probability in final_sums( *next_sum ).items():
+          distribution[final_sum] = distribution.get(final_sum, 0.0) + probability*final_probability
+
+      memory[ (dealer_sum, dealer_usable_aces) ] = distribution
+      return distribution
+
+    return final_sums( *self.sum_card_and_update_usable_aces( 0, dealer_card_up, 0 ) )
+
+  def transition_model(self):
+    state_to_id = { state:id for id,state in enumerate(self.states) }
+    terminal_id = state_to_id[ self.terminal_state ]
+    card_probabilities = self._card_probabilities()
+    dealer_distributions = { card: self.dealer_distribution(card) for card in range(1, 10+1) }
+
+    state_ids, action_ids, next_state_ids, probabilities = [], [], [], []
+    rewards = np.zeros( (len(self.states), len(self.actions)) )
+
+    for state in self.states[:-1]:
+      player_sum, dealer_card_up, has_ace = state
+      state_id = state_to_id[state]
+
+      # Stick, the dealer plays and the episode ends
+      state_ids.append( state_id ); action_ids.append( STICK )
+      next_state_ids.append( terminal_id ); probabilities.append( 1.0 )
+      rewards[state_id, STICK] = sum( probability*( 1 if dealer_sum > 21 else np.sign(player_sum-dealer_sum) )
+                                      for dealer_sum, probability in dealer_distributions[dealer_card_up].items() )
+
+      # Hit, one card is drawn
+      for card, probability in card_probabilities.items():
+        next_sum, usable_aces = self.sum_card_and_update_usable_aces( player_sum, card, has_ace )
+        state_ids.append( state_id ); action_ids.append( HIT ); probabilities.append( probability )
+
+        if next_sum > 21:
+          next_state_ids.append( terminal_id )
+          rewards[state_id, HIT] -= probability
+        elif next_sum == 21:
+          next_state_ids.append( terminal_id )
+          rewards[state_id, HIT] += probability
+        else:
+          next_state_ids.append( state_to_id[ (next_sum, dealer_card_up, int(usable_aces>0)) ] )
+
+    transitions = self._transition_matrix( state_ids, action_ids, next_state_ids, probabilities )
+    return transitions, rewards
+
 class MontainCar(BaseEnvironment):
   def initialize(self):
     self._position = np.random.uniform( -0.6, -0.4 )
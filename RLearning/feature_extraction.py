@@ -1,4 +1,5 @@
 from sklearn.base import BaseEstimator, TransformerMixin
+from scipy import sparse
 import numpy as np
 
 class DummyRepeater():
@@ -13,7 +14,7 @@ class DummyRepeater():
         return X
 
 class TileCoding():
-    def __init__(self, n_bins=[10], limits=[[0,1]], n_tiles=1, tile_shift=[1] ):
+    def __init__(self, n_bins=[10], limits=[[0,1]], n_tiles=1, tile_shift=[1], output="dense" ):
         """
         Discretize a envrioment using tiles.
 
@@ -27,11 +28,16 @@ class TileCoding():
             Total number of tiles created. Default is 1.
         tile_shift : None, optional
             Space between tiles
+        output : str, optional
+            Output format of transform, default is "dense". Can be some of the options {"dense", "indices", "sparse"}.
+            "dense" returns the one hot encoded array, "indices" returns the active feature of each tile
+            as an int array of shape (n_samples, n_tiles) and "sparse" returns a scipy.sparse CSR matrix.
         """
         self._n_bins = n_bins
         self._limits = np.array(limits)
         self._n_tiles = n_tiles
         self._tile_shift = tile_shift
+        self.output = output
 
     def __spacing(self, inferior_lim, superior_lim, n_points):
         """
@@ -70,6 +76,7 @@ class TileCoding():
         self : object
             Fitted TileCoding
         """
+        n_dims = len(self._n_bins)
         self._bins = [
                        [
                         # Bins for each tile
@@ -77,85 +84,63 @@ class TileCoding():
                                        self._limits[dim][1] + self._tile_shift[dim]*tile, 
                                        self._n_bins[dim]
                                        )
-                        for dim in range( len(self._n_bins) )
+                        for dim in range( n_dims )
                        ]
                        for tile in range( self._n_tiles )
                      ]
-                     
-        return self
 
-    def __transform_X_column(self, X_dim, bins):
-        """
-        Transform a column of an array X using a set of bins.
-        This function is used discretize a feature/dimension of X.
+        # Bin edges of every tile and dimension, padded with +inf, shape (n_tiles, n_dims, max(n_bins))
+        self._edges = np.full( (self._n_tiles, n_dims, max(self._n_bins)), np.inf )
+        for tile in range( self._n_tiles ):
+            for dim in range( n_dims ):
+                self._edges[tile, dim, :self._n_bins[dim]] = self._bins[tile][dim]
+        self._last_bin = np.array( self._n_bins, dtype=int ) - 1
 
-        Parameters
-        ----------
-        X_dim : array-like, 1D
-            Column of X
-        bins : array-like, 1D
-            bins used to transform
+        # Mixed radix multipliers mapping the discretized features to a global id
+        before_weight = np.array( self._n_bins, dtype=int )
+        before_weight[0] = 1
+        before_weight = np.roll( before_weight, -1 )
+        before_weight = np.flip( before_weight )
+        before_weight = np.cumprod( before_weight )
+        self._before_weight = np.flip( before_weight )
 
-        Returns
-        -------
-        numpy.array
-            Discretized array
-        """
-        X_dim_transformed = np.digitize( X_dim, bins, right=True )
-        X_dim_transformed = np.where(X_dim_transformed>=len(bins), 
-                                     len(bins)-1, 
-                                     X_dim_transformed
-                                    )
-        X_dim_transformed
-        
-        return X_dim_transformed
+        self._n_dummies = int( np.prod(self._n_bins) )
+        self._tile_offsets = np.arange( self._n_tiles )*self._n_dummies
+        self.n_features_out_ = self._n_dummies*self._n_tiles
+
+        return self
 
-    def __transform_tile(self, X, tile):
+    def transform_indices(self, X, out=None):
         """
-        Discretize all the features from an array X using the bins from a tile
+        Active feature of each tile, indexing the columns of the dense output.
+
+        All the tiles are discretized in a single broadcasted pass, following
+        ``np.digitize(..., right=True)`` semantics clipped to the last bin.
 
         Parameters
         ----------
         X : array-like, shape (n_samples, n_features)
-            array to be discretized
-        tile : int
-            Int representing the tile to be used
+            Array to be transformed
+        out : ndarray of int, shape (n_samples, n_tiles), optional
+            Preallocated array to store the result
 
         Returns
         -------
-        array-like, shape (n_samples, product self._n_bins[:])
-            One Hot Encoded array indicating the region in the current tile.
+        X_indices: ndarray of int, shape (n_samples, n_tiles)
+            Column of the active feature in each tile
         """
+        X = np.asarray(X, dtype=float)
 
-        # Discretizing each feature
-        tile_bins = self._bins[tile]
-        X_tile_transformed = np.array( 
-                                      [
-                                        self.__transform_X_column(X[:,dim], tile_bins[dim])
-                                        for dim in range( X.shape[1] ) 
-                                      ] 
-                                     ).T
-
-        # Calculating the global id considering each discretized feature
-        n_dummies = np.prod(self._n_bins)
-
-        before_weight = self._n_bins.copy()
-        before_weight[0] = 1
-        before_weight = np.roll( before_weight, -1 )
-        before_weight = np.flip( before_weight )
-        before_weight = np.cumprod( before_weight )
-        before_weight = np.flip( before_weight )
-
-        X_tile_ids = np.sum(X_tile_transformed*before_weight, axis=1)
-        X_tile_ids
+        # Number of edges strictly lower than each value, shape (n_samples, n_tiles, n_dims)
+        X_discretized = np.sum( X[:, None, :, None] > self._edges[None], axis=3 )
+        np.minimum( X_discretized, self._last_bin, out=X_discretized )
 
-        # One Hot Encoding the global id
-        X_tile_ohe_transformed = np.zeros( (len(X), n_dummies) )
-        X_tile_ohe_transformed[ np.arange(len(X)), X_tile_ids ] = 1
+        X_indices = np.matmul( X_discretized, self._before_weight, out=out )
+        X_indices += self._tile_offsets
 
-        return X_tile_ohe_transformed
+        return X_indices
 
-    def transform(self, X, y=None):
+    def transform(self, X, y=None, out=None):
         """
         Transform X in its discretized version
 
@@ -165,15 +150,34 @@ class TileCoding():
             Array to be transformed
         y : Any, optional
             Not used, just to provide .transform(X,y) support
+        out : ndarray, optional
+            Preallocated array to store the result, with the shape and dtype of the output.
+            Not supported when output is "sparse".
 
         Returns
         -------
         X_transformed: ndarray, shape (n_samples, total_dimensions)
-            X discretized array. total_dimensions = :math:`n\_tiles\prod_{i} {n\_bins[i]}`
+            X discretized array. total_dimensions = :math:`n\_tiles\prod_{i} {n\_bins[i]}`.
+            When output is "indices", an int array of shape (n_samples, n_tiles) and 
+            when output is "sparse", a CSR matrix of shape (n_samples, total_dimensions).
         """
-        X = np.array(X)
-        X_transformed = self.__transform_tile( X, 0 )
-        for tile in range(1, self._n_tiles ):
-            X_transformed = np.hstack( (X_transformed, self.__transform_tile(X.copy(), tile)) )
-        
-        return X_transformed
\ No newline at end of file
+        if self.output == "indices":
+            return self.transform_indices(X, out=out)
+
+        X_indices = self.transform_indices(X)
+        n_samples = X_indices.shape[0]
+        if self.output == "sparse":
+            return sparse.csr_matrix( ( np.ones( X_indices.size ), 
+                                        X_indices.ravel(), 
+                                        np.arange( 0, X_indices.size+1, self._n_tiles ) ),
+                                      shape=( n_samples, self.n_features_out_ )
+                                    )
+
+        # One Hot Encoding the global ids
+        if out is None:
+            out = np.zeros( (n_samples, self.n_features_out_) )
+        else:
+            out[:] = 0
+        out[ np.arange(n_samples)[:,None], X_indices ] = 1
+
+        return out
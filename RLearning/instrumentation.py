@@ -0,0 +1,185 @@
+import time
+
+import numpy as np
+
+ENVIRONMENT_METHODS = ( 'initialize_environment', 'reward', 'step', 'is_terminal' )
+INTERFACE_METHODS = ( 'state',
+                      'get_state_value', 'get_control_value', 'get_states_values',
+                      'get_state_action_values', 'get_states_action_values',
+                      'get_action_probabilities', 'get_states_action_probabilities',
+                      'get_expected_value', 'get_expected_values',
+                      'choose_random_action', 'choose_greedy_action', 'choose_greedy_actions' )
+UPDATE_METHODS = ( 'update_state_value', 'update_control_value',
+                   'update_state_values', 'update_control_values',
+                   'update_state_weights', 'update_control_weights' )
+PHASES = ( 'environment', 'interface', 'update' )
+
+RECORD_FIELDS = [ ('episode', int), ('steps', int), ('updates', int), ('return', float), ('seconds', float),
+                  ('environment_seconds', float), ('interface_seconds', float), ('update_seconds', float) ]
+
+class Instrumentation():
+    def __init__(self, timers=False, callbacks=None):
+        """
+        Collects per-episode statistics of a method's fit.
+
+        Passed to a method as ``instrumentation=``, it wraps the methods of the method's
+        interface for the duration of the fit and removes the wrappers afterwards,
+        so methods fitted without instrumentation run the plain loop.
+        Steps are counted on ``reward`` and ``step``, updates on the ``update_*`` methods,
+        the batched ones counting one update per target (per traced weight for ``update_*_weights``).
+
+        Parameters
+        ----------
+        timers : bool, optional
+            Whether to time the environment, interface and update phases, by default False.
+            The phases are exclusive: a call made inside another timed call,
+            e.g. an update reading a value, counts towards the outer one.
+            The time spent on the method's own logic is what is left of the episode time.
+        callbacks : list of callable or None, optional
+            Functions called as ``callback(method, record)`` at the end of each episode,
+            ``record`` being a dict with the fields of ``RECORD_FIELDS``, by default None
+        """
+        self.timers = timers
+        self.callbacks = callbacks if callbacks is not None else []
+        self.reset()
+
+    def reset(self):
+        self.records = []
+        self._wrapped = {}
+
+    def attach(self, method):
+        interface = method.env_interface
+        self._interface = interface
+        self._depth = 0
+        self.start_episode()
+
+        self._wrap( interface, 'reward', self._counted_reward )
+        self._wrap( interface, 'step', self._counted_step )
+        for name in UPDATE_METHODS:
+            self._wrap( interface, name, self._counted_update )
+
+        if not self.timers:
+            return
+
+        for phase, names in zip( PHASES, [ENVIRONMENT_METHODS, INTERFACE_METHODS, UPDATE_METHODS] ):
+            for name in names:
+                self._wrap( interface, name, lambda function, phase=phase: self._timed( function, phase ) )
+
+    def detach(self):
+        interface = self._interface
+        for name, original in self._wrapped.items():
+            if original is None:
+                delattr( interface, name )
+            else:
+                setattr( interface, name, original )
+        self._wrapped = {}
+        self._interface = None
+
+    def _wrap(self, interface, name, wrapper):
+        if not hasattr( interface, name ):
+            return
+        if name not in self._wrapped:
+            # Instance attributes are restored on detach, class methods just unshadowed
+            self._wrapped[name] = interface.__dict__.get( name )
+        setattr( interface, name, wrapper( getattr( interface, name ) ) )
+
+    def _counted_reward(self, reward):
+        def counted_reward(*args, **kwargs):
+            value = reward(*args, **kwargs)
+            self._steps += 1
+            self._return += value
+            return value
+        return counted_reward
+
+    def _counted_step(self, step):
+        def counted_step(*args, **kwargs):
+            transition = step(*args, **kwargs)
+            self._steps += 1
+            self._return += transition[1]
+            return transition
+        return counted_step
+
+    def _counted_update(self, update):
+        def counted_update(*args, **kwargs):
+            targets = kwargs['targets'] if 'targets' in kwargs else args[-1]
+            self._updates += np.size( targets )
+            return update(*args, **kwargs)
+        return counted_update
+
+    def _timed(self, function, phase):
+        def timed(*args, **kwargs):
+            if self._depth > 0:
+                return function(*args, **kwargs)
+
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._phase_seconds[phase] += time.perf_counter()-start
+                self._depth -= 1
+        return timed
+
+    def start_episode(self):
+        self._steps = 0
+        self._updates = 0
+        self._return = 0.0
+        self._phase_seconds = dict.fromkeys( PHASES, 0.0 )
+        self._episode_start = time.perf_counter()
+
+    def end_episode(self, method):
+        record = {
+            'episode': len(self.records),
+            'steps': self._steps,
+            'updates': self._updates,
+            'return': self._return,
+            'seconds': time.perf_counter()-self._episode_start,
+        }
+        for phase in PHASES:
+            record[phase+'_seconds'] = self._phase_seconds[phase]
+
+        self.records.append( record )
+        for callback in self.callbacks:
+            callback( method, record )
+
+    def to_array(self):
+        """
+        Per-episode records as a structured array, one row per episode
+        with the fields of ``RECORD_FIELDS``.
+        """
+        records = np.zeros( len(self.records), dtype=RECORD_FIELDS )
+        for field, _ in RECORD_FIELDS:
+            records[field] = [ record[field] for record in self.records ]
+        return records
+
+    def summary(self):
+        """
+        Totals over all the recorded episodes.
+
+        Returns
+        -------
+        dict
+            Number of episodes, steps and updates, mean return, total seconds,
+            steps and updates per second and, when timed, the seconds and the
+            fraction of the time spent in each phase ('other' being the method's own logic)
+        """
+        records = self.to_array()
+        seconds = records['seconds'].sum()
+        summary = {
+            'episodes': len(records),
+            'steps': int( records['steps'].sum() ),
+            'updates': int( records['updates'].sum() ),
+            'mean_return': float( records['return'].mean() ) if len(records) else 0.0,
+            'seconds': float(seconds),
+            'steps_per_second': records['steps'].sum()/seconds if seconds > 0 else 0.0,
+            'updates_per_second': records['updates'].sum()/seconds if seconds > 0 else 0.0,
+        }
+        if not self.timers:
+            return summary
+
+        phase_seconds = { phase: float( records[phase+'_seconds'].sum() ) for phase in PHASES }
+        phase_seconds['other'] = max( float(seconds) - sum( phase_seconds.values() ), 0.0 )
+        for phase, value in phase_seconds.items():
+            summary[phase+'_seconds'] = value
+            summary[phase+'_fraction'] = value/seconds if seconds > 0 else 0.0
+        return summary
@@ -1,6 +1,63 @@
+import os
+import json
+from multiprocessing import shared_memory
+
 import numpy as np
 from collections import defaultdict
 
+from RLearning.state_space import StateSpace
+from RLearning.approximators import SparseLinearApproximator
+from RLearning.base.base_environment import BaseBatchEnvironment
+
+HEADER_FILE = "header.json"
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("{} is not JSON serializable".format( type(value).__name__ ))
+
+def _from_json(value):
+    # JSON turns the tuple states and actions into lists
+    if isinstance(value, list):
+        return tuple( _from_json(item) for item in value )
+    return value
+
+def _as_key(state):
+    # Rows of state arrays as the hashable tuples used by the environments
+    if isinstance(state, np.ndarray):
+        return tuple( state.tolist() ) if state.ndim > 0 else state.item()
+    return state
+
+def _as_loaded(value):
+    # A state or action as it reads after a JSON round trip, to compare with loaded ones
+    return _from_json( json.loads( json.dumps( value, default=_to_json ) ) )
+
+def _save_checkpoint(path, header, arrays):
+    """
+    Save a checkpoint as a directory holding one .npy file per array and a JSON header.
+    Raw .npy files, unlike .npz archives, can be memory-mapped when loaded.
+    """
+    os.makedirs( path, exist_ok=True )
+
+    # Each file is written aside and renamed, so a crash never leaves a truncated file
+    for name, array in arrays.items():
+        file_path = os.path.join(path, name+".npy")
+        with open( file_path+".tmp", "wb" ) as file:
+            np.save( file, np.asarray(array) )
+        os.replace( file_path+".tmp", file_path )
+
+    header_path = os.path.join(path, HEADER_FILE)
+    with open( header_path+".tmp", "w" ) as file:
+        json.dump( dict( header, arrays=list(arrays) ), file, default=_to_json )
+    os.replace( header_path+".tmp", header_path )
+
+def _load_checkpoint(path, mmap_mode=None):
+    with open( os.path.join(path, HEADER_FILE) ) as file:
+        header = json.load( file )
+
+    arrays = { name: np.load( os.path.join(path, name+".npy"), mmap_mode=mmap_mode ) for name in header["arrays"] }
+    return header, arrays
+
 class TabularInterface():
     def __init__( self, alpha=1.0, alpha_decay="constant" ):
         """Tabular interface for tabular methods.
@@ -18,23 +75,151 @@ class TabularInterface():
     def fit( self, environment ):
         self.environment = environment
 
+        if getattr( self, "_resume", False ):
+            # Keep the loaded tables, once
+            self._resume = False
+            self._check_loaded_environment()
+            return self
+
         self._initialize_actions()
         self._initialize_states()
         self._initialize_values()
         self._initialize_policy()
 
         return self
+
+    # Checkpoint Methods
+    _checkpoint_arrays = ( "state_value", "state_action_value", "_state_count", "_state_action_count",
+                           "policy", "_greedy_value" )
+
+    def save(self, path):
+        """Save the tables, the counts and the greedy policy.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the checkpoint, created if needed. Holds one .npy file per array
+            and a JSON header with the parameters and the states and actions, in ID order.
+        """
+        header = { "interface": type(self).__name__, "alpha": self.alpha, "alpha_decay": self.alpha_decay,
+                   "actions": list(self._actions) }
+        if self._state_space is not None:
+            # The states are described by the space, no need to list them
+            header["state_space"] = self._state_space.to_dict()
+        else:
+            header["states"] = list(self._states)
+        arrays = { name: getattr(self, name) for name in self._checkpoint_arrays }
+        _save_checkpoint( path, header, arrays )
+
+    def load(self, path, mmap_mode=None):
+        """Load a checkpoint saved by :meth:`save`.
+
+        The interface can choose actions right away. When fitted next, e.g. by a method's fit,
+        it keeps the loaded tables instead of resetting them, so training resumes from them.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the checkpoint
+        mmap_mode : {None, 'r', 'r+', 'c'}, optional
+            Memory-map the arrays instead of reading them, see ``numpy.load``, by default None.
+            'r' opens huge tables instantly for acting only, 'r+' writes the updates back
+            to the checkpoint and 'c' keeps them in memory.
+
+        Returns
+        -------
+        self : TabularInterface
+        """
+        header, arrays = _load_checkpoint( path, mmap_mode )
+
+        self.alpha = header["alpha"]
+        self.alpha_decay = header["alpha_decay"]
+
+        self._set_actions( [ _from_json(action) for action in header["actions"] ] )
+
+        if "state_space" in header:
+            parameters = header["state_space"]
+            terminal_states = [ _from_json(state) for state in parameters["terminal_states"] ]
+            self._set_states( StateSpace.from_dict( parameters, terminal_states ) )
+        else:
+            self._set_states( [ _from_json(state) for state in header["states"] ] )
+
+        for name, array in arrays.items():
+            setattr( self, name, array )
+
+        self._resume = True
+        return self
+
+    def _check_loaded_environment(self):
+        if self._state_space is not None:
+            if self.environment.state_space != self._state_space:
+                raise ValueError("The environment states and actions do not match the loaded checkpoint")
+            checks = [ (self.environment.actions, self._actions) ]
+        else:
+            checks = [ (self.environment.states, self._states), (self.environment.actions, self._actions) ]
+
+        for values, loaded_values in checks:
+            if list(values) == loaded_values:
+                continue
+            if [ _as_loaded(value) for value in values ] != loaded_values:
+                raise ValueError("The environment states and actions do not match the loaded checkpoint")
     
     # Control Methods
     def _initialize_actions(self):
-        self._actions = self.environment.actions
-        self._id_to_action = dict( enumerate( self._actions ) )
-        self._action_to_id = { action:id for id,action in self._id_to_action.items() }
+        self._set_actions( self.environment.actions )
+
+    def _set_actions(self, actions):
+        self._actions = actions
+        self._action_to_id = { action:id for id,action in enumerate( self._actions ) }
     
     def _initialize_states(self):
-        self._states = self.environment.states
-        self._id_to_state = dict( enumerate( self._states ) )
-        self._state_to_id = { state:id for id,state in self._id_to_state.items() }
+        state_space = getattr( self.environment, "state_space", None )
+        self._set_states( state_space if state_space is not None else self.environment.states )
+
+    def _set_states(self, states):
+        self._states = states
+        if isinstance( states, StateSpace ):
+            # IDs are computed arithmetically, without lookup tables
+            self._state_space = states
+            self._state_to_id = None
+            self._encode_state = states.encode
+            return
+
+        self._state_space = None
+        self._state_to_id = { state:id for id,state in enumerate( self._states ) }
+        self._encode_state = self._state_to_id.__getitem__
+
+    def get_state_id(self, state):
+        return self._encode_state( state )
+
+    def get_state_ids(self, states):
+        """IDs of a batch of states, computed at once when the environment has a state space
+
+        Parameters
+        ----------
+        states : array-like, shape (n_states, ...)
+            Batch of states
+
+        Returns
+        -------
+        ndarray of int, shape (n_states,)
+        """
+        if self._state_space is not None:
+            return self._state_space.encode_batch( states )
+        return np.array( [ self._state_to_id[ _as_key(state) ] for state in states ], dtype=int )
+
+    def get_states(self, state_ids):
+        """States of a batch of IDs
+
+        Parameters
+        ----------
+        state_ids : array-like of int, shape (n_states,)
+
+        Returns
+        -------
+        list
+        """
+        return [ self._states[state_id] for state_id in state_ids ]
 
     def _initialize_values(self):
         self.state_value = np.zeros( len(self._states) )
@@ -44,11 +229,51 @@ class TabularInterface():
         self._state_action_count = np.zeros( (len(self._states), len(self._actions)) )
 
     def _initialize_policy(self):
-        self.policy = [ np.random.randint(0, len(self._actions)) for i in range(len(self._states)) ]
-        self.policy = np.array( self.policy )
+        # Greedy action and value of each state, kept up to date by the control updates
+        self.policy = np.zeros( len(self._states), dtype=int )
+        self._greedy_value = np.zeros( len(self._states) )
+        self.refresh_policy()
+
+    def refresh_policy(self, state_ids=None):
+        """Recompute the greedy action of some states from their control values.
+        Needed only after writing directly into ``state_action_value``.
+
+        Parameters
+        ----------
+        state_ids : array-like of int or None, optional
+            States to be refreshed, by default None (all the states)
+        """
+        if state_ids is None:
+            state_ids = slice(None)
+
+        action_values = self.state_action_value[state_ids, :]
+        self.policy[state_ids] = np.argmax( action_values, axis=1 )
+        self._greedy_value[state_ids] = np.max( action_values, axis=1 )
+
+    def _update_greedy_action(self, state_id, action_id):
+        value = self.state_action_value[state_id, action_id]
+        best_action_id = self.policy[state_id]
+
+        if action_id == best_action_id:
+            if value >= self._greedy_value[state_id]:
+                self._greedy_value[state_id] = value
+                return
+            # The best value decreased, another action may be better now
+            action_values = self.state_action_value[state_id, :]
+            best_action_id = np.argmax( action_values )
+            self.policy[state_id] = best_action_id
+            self._greedy_value[state_id] = action_values[best_action_id]
+            return
+
+        # Ties are broken by the lowest action ID, as np.argmax does
+        best_value = self._greedy_value[state_id]
+        if value > best_value or ( value == best_value and action_id < best_action_id ):
+            self.policy[state_id] = action_id
+            self._greedy_value[state_id] = value
 
     def set_initial_values(self, value):
         self.state_action_value[ :, : ] = value
+        self.refresh_policy()
 
     def get_state_value( self, state_id ):
         return self.state_value[state_id]
@@ -59,6 +284,9 @@ class TabularInterface():
     def get_state_action_values( self, state_id ):
         return self.state_action_value[state_id, :]
 
+    def get_states_action_values( self, state_ids ):
+        return self.state_action_value[state_ids, :]
+
     def get_states_values( self ):
         return self.state_value
 
@@ -89,8 +317,92 @@ class TabularInterface():
         if step_size==None:
             step_size=self._step_size()*self._alpha_decay( state_id, action_id )
 
-        difference = target-self.state_action_value[state_id][action_id]
-        self.state_action_value[state_id][action_id] += difference*step_size
+        difference = target-self.state_action_value[state_id, action_id]
+        self.state_action_value[state_id, action_id] += difference*step_size
+        self._update_greedy_action( state_id, action_id )
+
+    def update_state_values( self, state_ids, targets, step_size=None ):
+        """Update a batch of state values towards their targets at once.
+        State IDs are expected to be unique, otherwise only one of their updates is kept.
+
+        Parameters
+        ----------
+        state_ids : array-like of int, shape (n_samples,)
+            Numerical IDs representing the states
+        targets : array-like, shape (n_samples,)
+            Target values in the update scheme
+        step_size : float, array-like or None, optional
+            Update step size, by default None.
+            When None, uses the actual value of alpha
+        """
+        if step_size is None:
+            step_size = self._step_size()*self._alpha_decays( state_ids )
+
+        difference = targets-self.state_value[state_ids]
+        self.state_value[state_ids] += difference*step_size
+
+    def update_control_values( self, state_ids, action_ids, targets, step_size=None ):
+        """Update a batch of (state, action) control values towards their targets at once.
+        Pairs are expected to be unique, otherwise only one of their updates is kept.
+
+        Parameters
+        ----------
+        state_ids : array-like of int, shape (n_samples,)
+            Numerical IDs representing the states
+        action_ids : array-like of int, shape (n_samples,)
+            Numerical IDs representing the actions
+        targets : array-like, shape (n_samples,)
+            Target values in the update scheme
+        step_size : float, array-like or None, optional
+            Update step size, by default None.
+            When None, uses the actual value of alpha
+        """
+        if step_size is None:
+            step_size = self._step_size()*self._alpha_decays( state_ids, action_ids )
+
+        difference = targets-self.state_action_value[state_ids, action_ids]
+        self.state_action_value[state_ids, action_ids] += difference*step_size
+        self.refresh_policy( np.unique(state_ids) )
+
+    def merge_state_returns( self, return_sums, return_counts ):
+        """Merge returns accumulated elsewhere (e.g. by parallel workers) into the state values.
+        With "inverse-state" decay the values stay exact sample averages, otherwise each
+        visited value takes one step of size alpha per return towards their mean.
+
+        Parameters
+        ----------
+        return_sums : ndarray, shape (n_states,)
+            Sum of the returns observed for each state
+        return_counts : ndarray, shape (n_states,)
+            Number of returns observed for each state
+        """
+        self._merge_returns( self.state_value, self._state_count, return_sums, return_counts )
+
+    def merge_control_returns( self, return_sums, return_counts ):
+        """Merge returns accumulated elsewhere (e.g. by parallel workers) into the control values
+        and update the greedy policy. See :meth:`merge_state_returns`.
+
+        Parameters
+        ----------
+        return_sums : ndarray, shape (n_states, n_actions)
+            Sum of the returns observed for each (state, action) pair
+        return_counts : ndarray, shape (n_states, n_actions)
+            Number of returns observed for each (state, action) pair
+        """
+        self._merge_returns( self.state_action_value, self._state_action_count, return_sums, return_counts )
+        self.refresh_policy()
+
+    def _merge_returns( self, values, counts, return_sums, return_counts ):
+        visited = return_counts > 0
+        mean_returns = return_sums[visited]/return_counts[visited]
+
+        if self.alpha_decay == "inverse-state":
+            counts[visited] += return_counts[visited]
+            values[visited] += (return_sums[visited] - return_counts[visited]*values[visited])/counts[visited]
+            return
+
+        remaining = (1-self._step_size())**return_counts[visited]
+        values[visited] = mean_returns + remaining*(values[visited] - mean_returns)
 
     def _step_size(self):
         return self.alpha
@@ -105,19 +417,129 @@ class TabularInterface():
             
         return 1.0
 
+    def _alpha_decays(self, state_ids, action_ids=None):
+        if self.alpha_decay == "inverse-state":
+            np.add.at( self._state_count, state_ids, 1 )
+            if action_ids is None:
+                return 1.0/self._state_count[state_ids]
+            np.add.at( self._state_action_count, (state_ids, action_ids), 1 )
+            return 1.0/self._state_action_count[state_ids, action_ids]
+
+        return 1.0
+
+    # Linear Weight Methods
+    # The tables seen as linear weights of one-hot features, used by the eligibility trace methods
+    def check_linear_weights(self, values):
+        """Tables are always linear in their one-hot features, nothing to check
+        """
+
+    def get_state_features(self, state_id):
+        return np.array( [state_id] )
+
+    def get_control_features(self, state_id, action_id):
+        return np.array( [state_id*len(self._actions) + action_id] )
+
+    def get_state_weights(self):
+        """State values as a flat weight array, written in place by the methods that keep their own traces
+        """
+        return self.state_value
+
+    def get_state_step_size(self, features):
+        # The alpha decay is not applied
+        return self._step_size()
+
+    def get_control_step_size(self, features):
+        return self._step_size()
+
+    def update_state_weights(self, features, errors, step_size):
+        """Move the state values of some features by the step size times their errors.
+        Features are expected to be unique.
+
+        Parameters
+        ----------
+        features : array-like of int, shape (n_features,)
+            Features, as returned by ``get_state_features``
+        errors : array-like, shape (n_features,)
+            TD error times the trace of each feature
+        step_size : float
+            Update step size, as returned by ``get_state_step_size``
+        """
+        self.state_value[features] += step_size*errors
+
+    def update_control_weights(self, features, errors, step_size):
+        """Move the control values of some features by the step size times their errors and update the greedy policy.
+        Features are expected to be unique.
+
+        Parameters
+        ----------
+        features : array-like of int, shape (n_features,)
+            Features, as returned by ``get_control_features``
+        errors : array-like, shape (n_features,)
+            TD error times the trace of each feature
+        step_size : float
+            Update step size, as returned by ``get_control_step_size``
+        """
+        n_actions = len(self._actions)
+        state_ids, action_ids = np.divmod( features, n_actions )
+        self.state_action_value[state_ids, action_ids] += step_size*errors
+        self.refresh_policy( np.unique(state_ids) )
+
     def choose_random_action(self):
         return np.random.randint( 0, len( self._actions ) )
 
     def choose_greedy_action(self, state_id):
-        action_values = self.state_action_value[ state_id, : ].flatten()
-        best_action_id = np.argmax( action_values )
-        best_action_id = int( best_action_id )
+        return self.policy[state_id]
 
-        # Update policy
-        if best_action_id != self.policy[state_id]:
-            self.policy[state_id] = best_action_id
+    def choose_greedy_actions(self, state_ids):
+        return self.policy[state_ids]
 
-        return self.policy[state_id]
+    def get_action_probabilities(self, state_id, eps):
+        """Probability of each action in a state under the eps-greedy policy.
+
+        Parameters
+        ----------
+        state_id : int
+            Numerical ID representing the state
+        eps : float
+            Eps probability of the eps-greedy policy
+
+        Returns
+        -------
+        ndarray, shape (n_actions,)
+            :math:`\\epsilon/|A|` for every action, plus :math:`1-\\epsilon` for the greedy one
+        """
+        probabilities = np.full( len(self._actions), eps/len(self._actions) )
+        probabilities[ self.policy[state_id] ] += 1-eps
+        return probabilities
+
+    def get_states_action_probabilities(self, state_ids, eps):
+        state_ids = np.asarray(state_ids)
+        probabilities = np.full( (len(state_ids), len(self._actions)), eps/len(self._actions) )
+        probabilities[ np.arange(len(state_ids)), self.policy[state_ids] ] += 1-eps
+        return probabilities
+
+    def get_expected_value(self, state_id, eps):
+        """Expected control value of a state under the eps-greedy policy, 
+        :math:`\\sum_a \\pi(a|s) q(s,a)`.
+
+        Parameters
+        ----------
+        state_id : int
+            Numerical ID representing the state
+        eps : float
+            Eps probability of the eps-greedy policy
+
+        Returns
+        -------
+        float
+            Expected control value
+        """
+        action_values = self.state_action_value[state_id, :]
+        return eps*action_values.mean() + (1-eps)*self._greedy_value[state_id]
+
+    def get_expected_values(self, state_ids, eps):
+        action_values = self.state_action_value[state_ids, :]
+        return eps*action_values.mean(axis=1) + (1-eps)*self._greedy_value[state_ids]
     
     # environment Interaction Methods
     def initialize_environment(self):
@@ -125,19 +547,135 @@ class TabularInterface():
 
     def state(self):
         state = self.environment.state()
-        state_id = self._state_to_id[ state ]
+        state_id = self._encode_state( state )
 
         return state_id
 
     def reward(self, action_id):
-        action = self._id_to_action[ action_id ]
+        action = self._actions[ action_id ]
         reward = self.environment.reward(action)
 
         return reward
 
+    def step(self, action_id):
+        """Take an action, returning the next state ID, the reward and whether the episode ended.
+        Same as calling reward, state and is_terminal, in a single call.
+        """
+        next_state, reward, done = self.environment.step( self._actions[ action_id ] )
+        return self._encode_state( next_state ), reward, done
+
     def is_terminal(self):
         return self.environment.is_terminal()
 
+class SharedTabularInterface( TabularInterface ):
+    def __init__( self, alpha=1.0, alpha_decay="constant" ):
+        """Tabular interface whose tables live in a ``multiprocessing.shared_memory`` block.
+
+        The values, the counts and the greedy policy cache are views over one shared block,
+        and pickling the interface sends the name of the block instead of the tables.
+        Worker processes receiving it update the same tables, Hogwild style: without locks,
+        an update racing with another one may be lost, and the greedy cache may go stale
+        until :meth:`refresh_policy` is called. Used by the TD methods with ``n_jobs>1``.
+
+        The block is freed by :meth:`close`, or when the interface that created it
+        is garbage collected.
+
+        Parameters
+        ----------
+        alpha : float, optional
+            step-size parameter, by default 1.0
+        alpha_decay : str, optional
+            Decaying alpha mode, default is "constant". Can be some of the options {"inverse-state", "constant"}.
+        """
+        super(SharedTabularInterface, self).__init__( alpha=alpha, alpha_decay=alpha_decay )
+        self._shared_memory = None
+        self._owner = False
+
+    def _shared_layout(self):
+        n_states, n_actions = len(self._states), len(self._actions)
+        return [ ( "state_value", (n_states,), np.float64 ),
+                 ( "state_action_value", (n_states, n_actions), np.float64 ),
+                 ( "_state_count", (n_states,), np.float64 ),
+                 ( "_state_action_count", (n_states, n_actions), np.float64 ),
+                 ( "policy", (n_states,), np.int64 ),
+                 ( "_greedy_value", (n_states,), np.float64 ) ]
+
+    def _attach(self, name=None):
+        """
+        Map the tables onto the shared block, creating it when ``name`` is None.
+        All the dtypes have 8 bytes, so every table stays aligned.
+        """
+        layout = self._shared_layout()
+        sizes = [ int( np.prod(shape) )*np.dtype(dtype).itemsize for _, shape, dtype in layout ]
+        if name is None:
+            # New blocks are zero filled
+            self._shared_memory = shared_memory.SharedMemory( create=True, size=max( sum(sizes), 1 ) )
+            self._owner = True
+        else:
+            self._shared_memory = shared_memory.SharedMemory( name=name )
+
+        offset = 0
+        for (attribute, shape, dtype), size in zip( layout, sizes ):
+            setattr( self, attribute, np.ndarray( shape, dtype=dtype, buffer=self._shared_memory.buf, offset=offset ) )
+            offset += size
+
+    def _initialize_values(self):
+        self.close()
+        self._attach()
+
+    def _initialize_policy(self):
+        # The policy arrays are already in the shared block
+        self.refresh_policy()
+
+    def load(self, path, mmap_mode=None):
+        super(SharedTabularInterface, self).load( path, mmap_mode )
+
+        # Loaded tables are copied into a new shared block
+        tables = { attribute: getattr(self, attribute) for attribute, _, _ in self._shared_layout() }
+        self.close()
+        self._attach()
+        for attribute, table in tables.items():
+            getattr(self, attribute)[...] = table
+        return self
+
+    def close(self):
+        """
+        Detach from the shared block, the tables are copied into private memory and
+        remain usable. The block is freed when this interface is the one that created it.
+        """
+        if self._shared_memory is None:
+            return
+
+        for attribute, _, _ in self._shared_layout():
+            setattr( self, attribute, np.array( getattr(self, attribute) ) )
+
+        self._shared_memory.close()
+        if self._owner:
+            self._shared_memory.unlink()
+        self._shared_memory = None
+        self._owner = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._shared_memory is None:
+            return state
+
+        for attribute, _, _ in self._shared_layout():
+            del state[attribute]
+        state["_shared_memory"] = self._shared_memory.name
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        name = state["_shared_memory"]
+        self.__dict__.update( state )
+        if isinstance( name, str ):
+            self._attach( name )
+
+    def __del__(self):
+        if getattr( self, "_owner", False ) and self._shared_memory is not None:
+            self._shared_memory.unlink()
+
 class ApproximatedInterface():
     def __init__(self, 
                  control_feature_extractor, 
@@ -155,9 +693,84 @@ class ApproximatedInterface():
         self.environment = environment
 
         self._initialize_actions()
+        if getattr( self, "_resume", False ):
+            # Keep the loaded weights, only the feature extractors are fitted
+            self._resume = False
+            if [ _as_loaded(action) for action in self._actions ] != self._loaded_actions:
+                raise ValueError("The environment actions do not match the loaded checkpoint")
+            self._fit_models( update=False )
+            return self
+
         self._fit_models()
         return self
 
+    # Checkpoint Methods
+    _weight_attributes = ( "weights", "coef_", "intercept_" )
+    # Fit state of the sklearn models, t_ drives the learning rate schedule of SGDRegressor
+    _fit_state_attributes = ( "t_", "n_features_in_" )
+
+    def _approximators(self):
+        approximators = { "control": self.control_value_approximator }
+        if self._approximating_state_value():
+            approximators["state"] = self.state_value_approximator
+        return approximators
+
+    def save(self, path):
+        """Save the weights of the value approximators.
+
+        Linear approximators are supported: :class:`RLearning.approximators.SparseLinearApproximator`
+        (``weights``) and the sklearn linear models (``coef_`` and ``intercept_``, plus ``t_`` and
+        ``n_features_in_`` when present, so the learning rate schedule continues after loading).
+        The feature extractors are not saved, they are fitted again from their parameters.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the checkpoint, created if needed. Holds one .npy file per array
+            and a JSON header with the actions, in ID order.
+        """
+        arrays = {}
+        for prefix, approximator in self._approximators().items():
+            attributes = [ name for name in self._weight_attributes if hasattr(approximator, name) ]
+            if not attributes:
+                raise ValueError("{} has no weights to be saved".format( type(approximator).__name__ ))
+            attributes += [ name for name in self._fit_state_attributes if hasattr(approximator, name) ]
+            for name in attributes:
+                arrays[ prefix+"_"+name ] = getattr(approximator, name)
+
+        header = { "interface": type(self).__name__, "actions": list(self._actions) }
+        _save_checkpoint( path, header, arrays )
+
+    def load(self, path, mmap_mode=None):
+        """Load the weights saved by :meth:`save` into the approximators of this interface,
+        which should be built with the same feature extractors and approximators.
+        When fitted next, the interface keeps the loaded weights instead of resetting them.
+
+        Parameters
+        ----------
+        path : str
+            Directory of the checkpoint
+        mmap_mode : {None, 'r', 'r+', 'c'}, optional
+            Memory-map the arrays instead of reading them, see ``numpy.load``, by default None
+
+        Returns
+        -------
+        self : ApproximatedInterface
+        """
+        header, arrays = _load_checkpoint( path, mmap_mode )
+
+        approximators = self._approximators()
+        for name, array in arrays.items():
+            prefix, attribute = name.split("_", 1)
+            if prefix not in approximators:
+                raise ValueError("The checkpoint has {} weights, but the interface has no such approximator".format( prefix ))
+            # Scalars, as t_, are restored as Python numbers
+            setattr( approximators[prefix], attribute, array.item() if array.ndim == 0 else array )
+
+        self._loaded_actions = [ _from_json(action) for action in header["actions"] ]
+        self._resume = True
+        return self
+
     def _approximating_state_value(self):
         if self.state_value_approximator == None:
             return False
@@ -167,31 +780,41 @@ class ApproximatedInterface():
 
     def _initialize_actions(self):
         self._actions = self.environment.actions
-        self._id_to_action = dict( enumerate( self._actions ) )
-        self._action_to_id = { action:id for id,action in self._id_to_action.items() }
+        self._action_to_id = { action:id for id,action in enumerate( self._actions ) }
+        self._actions_array = np.array( self._actions )
+        self._actions_rows = self._actions_array.reshape( len(self._actions), -1 ).astype(float)
     
-    def _fit_models(self):
+    def _fit_models(self, update=True):
         self.initialize_environment()
 
         state = self.environment.state()
+        if isinstance( self.environment, BaseBatchEnvironment ):
+            # Batched environments hold one state per episode
+            state = state[0]
         action = self.choose_random_action()
 
         if self._approximating_state_value():
-            self.state_feature_extractor.fit( [state] )
+            self.state_feature_extractor.fit( self._state_rows( [state] ) )
 
         self.control_feature_extractor.fit( np.hstack( (np.array(state), np.array(action)) ) )
 
-        self.update_state_value( state, 0 )
-        self.update_control_value( state, action, 0 )
+        if update:
+            self.update_state_value( state, 0 )
+            self.update_control_value( state, action, 0 )
 
         self.initialize_environment()
 
+    def _state_rows(self, states):
+        # Scalar states, as the walks' positions, become rows of one feature
+        states = np.asarray( states, dtype=float )
+        return states.reshape( len(states), -1 )
+
     ## Control Methods
     def get_state_value(self, state):
         if not self._approximating_state_value():
             return 0
 
-        state_vector = self.state_feature_extractor.transform( [state_vector] )
+        state_vector = self.state_feature_extractor.transform( self._state_rows( [state] ) )
         return self.state_value_approximator.predict( state_vector )[0]
 
     def get_control_value(self, state, action):
@@ -200,9 +823,51 @@ class ApproximatedInterface():
 
         return self.control_value_approximator.predict( control_vector )[0]
 
+    def _controls(self, states):
+        """Build the (state, action) rows of every state in a batch paired with every action.
+
+        Parameters
+        ----------
+        states : array-like, shape (n_states, ...)
+            Batch of states
+
+        Returns
+        -------
+        ndarray, shape (n_states*n_actions, n_state_features+n_action_features)
+            Rows ordered by state and then by action
+        """
+        states = np.asarray( states, dtype=float )
+        states = states.reshape( len(states), -1 )
+        n_states, n_state_features = states.shape
+        n_actions, n_action_features = self._actions_rows.shape
+
+        controls = np.empty( (n_states, n_actions, n_state_features+n_action_features) )
+        controls[:, :, :n_state_features] = states[:, None, :]
+        controls[:, :, n_state_features:] = self._actions_rows[None, :, :]
+
+        return controls.reshape( n_states*n_actions, -1 )
+
     def get_state_action_values(self, state):
-        control_values = [ self.get_control_value(state, action) for action in self._actions ]
-        return np.array(control_values)
+        return self.get_states_action_values( [state] )[0]
+
+    def get_states_action_values(self, states):
+        """Control values of every action for a batch of states, 
+        using a single transform and a single predict call.
+
+        Parameters
+        ----------
+        states : array-like, shape (n_states, ...)
+            Batch of states
+
+        Returns
+        -------
+        ndarray, shape (n_states, n_actions)
+            Control value of each (state, action) pair
+        """
+        control_vectors = self.control_feature_extractor.transform( self._controls(states) )
+        control_values = self.control_value_approximator.predict( control_vectors )
+
+        return np.asarray(control_values).reshape( len(states), len(self._actions) )
     
     def get_states_values(self):
         """NOT AVAILABLE FOR APPROXIMATED INTERFACE
@@ -220,7 +885,7 @@ class ApproximatedInterface():
         if not self._approximating_value():
             return
 
-        state_vector = self.state_feature_extractor.transform( [state] )
+        state_vector = self.state_feature_extractor.transform( self._state_rows( [state] ) )
         self.state_value_approximator.partial_fit( X=state_vector, y=[target] )
     
     def update_control_value(self, state, action, target ):
@@ -228,17 +893,164 @@ class ApproximatedInterface():
         control_vector = self.control_feature_extractor.transform( [control] )
         self.control_value_approximator.partial_fit( X=control_vector, y=[target] )
 
+    def update_state_values(self, states, targets ):
+        """Update a batch of state values with a single transform and partial_fit call
+        """
+        if not self._approximating_value() or len(targets) == 0:
+            return
+
+        state_vectors = self.state_feature_extractor.transform( self._state_rows( states ) )
+        self.state_value_approximator.partial_fit( X=state_vectors, y=targets )
+
+    def update_control_values(self, states, actions, targets ):
+        """Update a batch of (state, action) control values with a single transform and partial_fit call
+        """
+        if len(targets) == 0:
+            return
+
+        states = np.asarray( states, dtype=float )
+        actions = np.asarray( actions, dtype=float )
+        controls = np.hstack( (states.reshape( len(states), -1 ), actions.reshape( len(actions), -1 )) )
+        control_vectors = self.control_feature_extractor.transform( controls )
+        self.control_value_approximator.partial_fit( X=control_vectors, y=targets )
+
+    # Linear Weight Methods
+    # Need feature extractors with output="indices" and SparseLinearApproximator,
+    # used by the eligibility trace methods
+    def check_linear_weights(self, values):
+        """Check that the state or the control values are linear in active feature indices,
+        raising a ValueError otherwise.
+
+        Parameters
+        ----------
+        values : str
+            Values whose weights are used, "state" or "control"
+        """
+        if values == "state":
+            if not self._approximating_state_value():
+                raise ValueError("The state values are not approximated, a state feature extractor "
+                                 "and a state value approximator are needed")
+            extractor, approximator = self.state_feature_extractor, self.state_value_approximator
+        else:
+            extractor, approximator = self.control_feature_extractor, self.control_value_approximator
+
+        if getattr( extractor, "output", None ) != "indices":
+            raise ValueError("The {} feature extractor should output active feature indices, "
+                             "e.g. TileCoding(output=\"indices\")".format( values ))
+        if not isinstance( approximator, SparseLinearApproximator ):
+            raise ValueError("The {} value approximator should be a SparseLinearApproximator, "
+                             "got {}".format( values, type(approximator).__name__ ))
+
+    def get_state_features(self, state):
+        """Active feature indices of a state
+        """
+        return self.state_feature_extractor.transform( self._state_rows( [state] ) )[0]
+
+    def get_state_weights(self):
+        """State value weights as a flat array, written in place by the methods that keep their own traces
+        """
+        return self.state_value_approximator.weights
+
+    def get_state_step_size(self, features):
+        # Each active feature takes alpha/n_active of the error, as in SparseLinearApproximator.partial_fit
+        return self.state_value_approximator.alpha/len(features)
+
+    def get_control_features(self, state, action):
+        """Active feature indices of a (state, action) pair
+        """
+        control = np.hstack( (np.array(state), np.array(action)) )
+        return self.control_feature_extractor.transform( [control] )[0]
+
+    def get_control_step_size(self, features):
+        return self.control_value_approximator.alpha/len(features)
+
+    def update_state_weights(self, features, errors, step_size):
+        """Move the state value weights of some unique features by the step size times their errors
+        """
+        self.state_value_approximator.weights[features] += step_size*errors
+
+    def update_control_weights(self, features, errors, step_size):
+        """Move the control value weights of some unique features by the step size times their errors
+        """
+        self.control_value_approximator.weights[features] += step_size*errors
+
     def choose_random_action(self):
         random_action_id = np.random.randint( 0, len( self._actions ) )
-        random_action = self._id_to_action[random_action_id]
+        random_action = self._actions[random_action_id]
         return random_action
 
     def choose_greedy_action(self, state):
         action_values = self.get_state_action_values(state).flatten()
         best_action_id = np.argmax( action_values )
-        best_action = self._id_to_action[best_action_id]
+        best_action = self._actions[best_action_id]
         return best_action
 
+    def choose_greedy_actions(self, states):
+        """Greedy action of a batch of states
+
+        Parameters
+        ----------
+        states : array-like, shape (n_states, ...)
+            Batch of states
+
+        Returns
+        -------
+        ndarray, shape (n_states, ...)
+            Greedy action of each state
+        """
+        best_action_ids = np.argmax( self.get_states_action_values(states), axis=1 )
+        return self._actions_array[best_action_ids]
+
+    def get_action_probabilities(self, state, eps):
+        return self.get_states_action_probabilities( [state], eps )[0]
+
+    def get_states_action_probabilities(self, states, eps, action_values=None):
+        """Probability of each action under the eps-greedy policy for a batch of states
+
+        Parameters
+        ----------
+        states : array-like, shape (n_states, ...)
+            Batch of states
+        eps : float
+            Eps probability of the eps-greedy policy
+        action_values : ndarray, shape (n_states, n_actions), optional
+            Control values of the states, computed when not given
+
+        Returns
+        -------
+        ndarray, shape (n_states, n_actions)
+            Probabilities, ordered as the environment actions
+        """
+        if action_values is None:
+            action_values = self.get_states_action_values(states)
+
+        probabilities = np.full( action_values.shape, eps/len(self._actions) )
+        probabilities[ np.arange(len(action_values)), np.argmax( action_values, axis=1 ) ] += 1-eps
+        return probabilities
+
+    def get_expected_value(self, state, eps):
+        return self.get_expected_values( [state], eps )[0]
+
+    def get_expected_values(self, states, eps):
+        """Expected control value of a batch of states under the eps-greedy policy,
+        reusing a single batched prediction for the greedy actions and the expectation.
+
+        Parameters
+        ----------
+        states : array-like, shape (n_states, ...)
+            Batch of states
+        eps : float
+            Eps probability of the eps-greedy policy
+
+        Returns
+        -------
+        ndarray, shape (n_states,)
+            Expected control values
+        """
+        action_values = self.get_states_action_values(states)
+        probabilities = self.get_states_action_probabilities( states, eps, action_values )
+        return np.sum( probabilities*action_values, axis=1 )
+
     # environment Interaction Methods
     def initialize_environment(self):
         self.environment.initialize()
@@ -249,5 +1061,11 @@ class ApproximatedInterface():
     def reward(self, action):
         return self.environment.reward(action)
 
+    def step(self, action):
+        """Take an action, returning the next state, the reward and whether the episode ended.
+        Same as calling reward, state and is_terminal, in a single call.
+        """
+        return self.environment.step(action)
+
     def is_terminal(self):
         return self.environment.is_terminal()
\ No newline at end of file
@@ -1,15 +1,16 @@
 import numpy as np
 import random
-
-from collections import defaultdict
+import multiprocessing
 
 from RLearning.base.base_methods import BaseMethod
 from RLearning.interfaces import TabularInterface
+from RLearning.buffers import TrajectoryBuffer, discounted_returns
 
 INFINITY = np.inf
 
 class MonteCarlo( BaseMethod ):
-  def __init__(self, *args, env_interface=TabularInterface(), eps=0.0, mode='first-visit', **kwargs):
+  def __init__(self, *args, env_interface=TabularInterface(), eps=0.0, mode='first-visit', 
+               n_jobs=1, sync_interval=1000, random_state=None, **kwargs):
     """Monte Carlo
 
     Parameters
@@ -21,11 +22,27 @@ class MonteCarlo( BaseMethod ):
     mode : str, optional
         The algorithm behaviour when updating the values, should be 'first-visit' or 'any-visit'.
         The 'first-visit' mode only works with Tabular environment.
+    n_jobs : int, optional
+        Number of worker processes generating episodes, by default 1.
+        When greater than 1, only works with TabularInterface.
+    sync_interval : int, optional
+        Number of episodes simulated by all the workers between two merges of
+        their return statistics into the interface, by default 1000.
+        The updated greedy policy is sent back to the workers after each merge.
+    random_state : int or None, optional
+        Seed of the workers when n_jobs is greater than 1, by default None.
+        A fixed seed makes the parallel results deterministic.
+    instrumentation : RLearning.instrumentation.Instrumentation or None, optional
+        Collects per-episode counters and timers, by default None.
+        Not used when n_jobs is greater than 1.
     """
 
     self._eps = eps
     self.env_interface = env_interface
     self.mode = mode
+    self.n_jobs = n_jobs
+    self.sync_interval = sync_interval
+    self.random_state = random_state
     super(MonteCarlo, self).__init__(*args, **kwargs)
 
   def action( self, state ):
@@ -36,69 +53,137 @@ class MonteCarlo( BaseMethod ):
 
   def fit(self, environment):
     self.env_interface.fit(environment)
-    self._create_first_visit_variables()
+    self._create_trajectory_buffer()
 
-    for episode in range( self.episodes ):
-      self.env_interface.initialize_environment()
-      self.simulate()
+    if self.n_jobs > 1:
+      self._parallel_fit()
+      return
 
-  def _create_first_visit_variables(self):
-    self.state_first_vist = defaultdict( lambda: np.inf )
-    self.control_first_vist = defaultdict( lambda: np.inf )
+    self._run_episodes()
 
-  def simulate(self):
-    actions = []
-    states  = []
-    rewards = []
+  def _parallel_fit(self):
+    if not isinstance( self.env_interface, TabularInterface ):
+      raise ValueError("MonteCarlo with n_jobs>1 only works with TabularInterface")
 
-    ## Playing the game
-    time = 0
-    while not self.env_interface.is_terminal():
-      state = self.env_interface.state()
-      action = self.action(state)
-      reward = self.env_interface.reward(action)
+    seed_sequence = np.random.SeedSequence( self.random_state )
+    with multiprocessing.Pool( self.n_jobs ) as pool:
+      for sync_start in range( 0, self.episodes, self.sync_interval ):
+        sync_episodes = min( self.sync_interval, self.episodes-sync_start )
+        worker_episodes = [ len(chunk) for chunk in np.array_split( np.arange(sync_episodes), self.n_jobs ) ]
+        worker_seeds = [ int( child.generate_state(1)[0] ) for child in seed_sequence.spawn( self.n_jobs ) ]
 
-      rewards.append( reward )
-      states.append( state )
-      actions.append( action )
+        # The interface carries the current tables, so workers act greedily w.r.t. the merged policy
+        jobs = [ ( self.env_interface, self._eps, self.mode, self.discount, n_episodes, seed ) 
+                 for n_episodes, seed in zip( worker_episodes, worker_seeds ) if n_episodes > 0 ]
+        
+        for statistics in pool.starmap( _simulate_episodes, jobs ):
+          self.env_interface.merge_state_returns( statistics[0], statistics[1] )
+          self.env_interface.merge_control_returns( statistics[2], statistics[3] )
 
-      if self.mode == 'first-visit':
-        self.state_first_vist[state] = min( self.state_first_vist[state], time )
-        self.control_first_vist[(state, action)] = min( self.control_first_vist[(state, action)], time )
+  def _create_trajectory_buffer(self):
+    self._trajectory = TrajectoryBuffer()
 
-      time+=1
+  def simulate(self):
+    trajectory = self._generate_episode()
 
     ## Policy Improvement
-    self.policy_improvement( states, rewards, actions )
+    self.policy_improvement( trajectory )
 
-  def policy_improvement(self, states, rewards, actions):
-    ## Policy evaluation
-    cumulative_return = 0.0
-    for time_back in reversed( range(0, len(rewards)) ):
-      state = states[time_back]
-      reward = rewards[time_back]
-      action = actions[time_back]
-      cumulative_return = cumulative_return*self.discount + reward
+  def _generate_episode(self):
+    trajectory = self._trajectory
+    trajectory.clear()
 
-      if self._can_improve(time_back, state):
-        self.env_interface.update_state_value( state, cumulative_return )
+    ## Playing the game
+    state = self.env_interface.state()
+    done = self.env_interface.is_terminal()
+    while not done:
+      action = self.action(state)
+      next_state, reward, done = self.env_interface.step(action)
 
-      if self._can_improve(time_back, state, action):
-        self.env_interface.update_control_value( state, action, cumulative_return )
+      trajectory.append( state, action, reward )
+      state = next_state
 
-      time_back-=1
+    return trajectory
 
-  def _can_improve( self, time, state, action=None ):
+  def _episode_returns(self, trajectory):
+    """
+    Return of each time step of the episode and which time steps update
+    the state value and the control value.
+
+    Returns
+    -------
+    returns : ndarray, shape (n_steps,)
+        Discounted return of each time step
+    state_mask, control_mask : ndarray of bool, shape (n_steps,)
+        Time steps used to update states and (state, action) pairs.
+        In 'first-visit' mode, only the first occurrence of each one.
+    """
+    returns = discounted_returns( trajectory.rewards, self.discount )
     if self.mode != 'first-visit':
-      return True
-    
-    if action == None:
-      return_value = self.state_first_vist[state] == time
-      self.state_first_vist[state] = np.inf
-
-      return return_value
-
-    return_value = self.control_first_vist[ (state, action) ] == time
-    self.control_first_vist[(state, action)] = np.inf
-    
-    return return_value
+      all_steps = np.ones( len(returns), dtype=bool )
+      return returns, all_steps, all_steps
+
+    states, actions = trajectory.states, trajectory.actions
+    if states.ndim == 1 and actions.ndim == 1 and states.dtype.kind in 'iu' and actions.dtype.kind in 'iu':
+      # Tabular IDs, each (state, action) pair becomes a single ID
+      controls = states*( actions.max()+1 ) + actions
+    else:
+      states = states.reshape( len(returns), -1 )
+      controls = np.hstack( (states, actions.reshape( len(returns), -1 )) )
+
+    state_mask = np.zeros( len(returns), dtype=bool )
+    state_mask[ np.unique( states, axis=0, return_index=True )[1] ] = True
+
+    control_mask = np.zeros( len(returns), dtype=bool )
+    control_mask[ np.unique( controls, axis=0, return_index=True )[1] ] = True
+
+    return returns, state_mask, control_mask
+
+  def policy_improvement(self, trajectory):
+    ## Policy evaluation
+    returns, state_mask, control_mask = self._episode_returns( trajectory )
+    states, actions = trajectory.states, trajectory.actions
+
+    if self.mode == 'first-visit':
+      # Each state and (state, action) pair appears once, so all updates can be applied at once
+      self.env_interface.update_state_values( states[state_mask], returns[state_mask] )
+      self.env_interface.update_control_values( states[control_mask], actions[control_mask], returns[control_mask] )
+      return
+
+    for time_back in reversed( range(0, len(returns)) ):
+      self.env_interface.update_state_value( states[time_back], returns[time_back] )
+      self.env_interface.update_control_value( states[time_back], actions[time_back], returns[time_back] )
+
+def _simulate_episodes(env_interface, eps, mode, discount, n_episodes, seed):
+  """
+  Worker of the parallel MonteCarlo. Simulates episodes with a snapshot of the
+  interface and accumulates the returns of each state and (state, action) pair.
+
+  Returns
+  -------
+  state_sums, state_counts, control_sums, control_counts : ndarray
+      Sum and number of the returns observed for each state and each (state, action) pair
+  """
+  np.random.seed( seed )
+  random.seed( seed )
+
+  method = MonteCarlo( env_interface=env_interface, eps=eps, mode=mode, discount=discount )
+  method._create_trajectory_buffer()
+
+  state_sums = np.zeros_like( env_interface.state_value )
+  state_counts = np.zeros_like( env_interface.state_value )
+  control_sums = np.zeros_like( env_interface.state_action_value )
+  control_counts = np.zeros_like( env_interface.state_action_value )
+
+  for episode in range( n_episodes ):
+    env_interface.initialize_environment()
+    trajectory = method._generate_episode()
+    returns, state_mask, control_mask = method._episode_returns( trajectory )
+    states, actions = trajectory.states, trajectory.actions
+
+    np.add.at( state_sums, states[state_mask], returns[state_mask] )
+    np.add.at( state_counts, states[state_mask], 1 )
+    np.add.at( control_sums, (states[control_mask], actions[control_mask]), returns[control_mask] )
+    np.add.at( control_counts, (states[control_mask], actions[control_mask]), 1 )
+
+  return state_sums, state_counts, control_sums, control_counts
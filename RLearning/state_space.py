@@ -0,0 +1,167 @@
+import itertools
+
+import numpy as np
+
+class StateSpace():
+    def __init__(self, dimensions, terminal_states=()):
+        """
+        Product state space, whose states are numbered arithmetically instead of
+        through lookup tables. Also works as a read-only sequence of the states, in ID order.
+
+        Each dimension is a range of consecutive integers, increasing or decreasing.
+        The ID of a state is its mixed-radix number, the last dimension varying the fastest,
+        as in ``itertools.product``. Terminal states lie outside the product and take
+        the IDs following it, from ``prod(sizes)`` on, in the given order.
+
+        Parameters
+        ----------
+        dimensions : range or list of range
+            Values of each dimension, with step 1 or -1.
+            A single range, not in a list, describes scalar (non-tuple) states.
+        terminal_states : list, optional
+            States outside the product, by default ()
+        """
+        self._scalar = isinstance(dimensions, range)
+        if self._scalar:
+            dimensions = [dimensions]
+
+        for dimension in dimensions:
+            if not isinstance(dimension, range) or abs(dimension.step) != 1 or len(dimension) == 0:
+                raise ValueError("Dimensions should be non-empty ranges with step 1 or -1")
+
+        self.dimensions = list(dimensions)
+        self.terminal_states = list(terminal_states)
+        self.sizes = np.array( [ len(dimension) for dimension in self.dimensions ] )
+        self.n_regular_states = int( np.prod(self.sizes) )
+        self.n_states = self.n_regular_states + len(self.terminal_states)
+
+        # id = offset + sum( value*multiplier ), a decreasing range has a negative multiplier
+        strides = np.append( np.cumprod( self.sizes[::-1] )[::-1][1:], 1 )
+        self._multipliers = strides*[ dimension.step for dimension in self.dimensions ]
+        self._starts = np.array( [ dimension.start for dimension in self.dimensions ] )
+        self._offset = -int( np.dot( self._starts, self._multipliers ) )
+        self._low = np.array( [ min(dimension) for dimension in self.dimensions ] )
+        self._high = np.array( [ max(dimension) for dimension in self.dimensions ] )
+
+        self._bounds = [ ( int(low), int(high), int(multiplier) )
+                         for low, high, multiplier in zip( self._low, self._high, self._multipliers ) ]
+        self._terminal_ids = { state: self.n_regular_states+i for i, state in enumerate(self.terminal_states) }
+
+        for state in self.terminal_states:
+            if self._regular_id(state) is not None:
+                raise ValueError("Terminal state {} lies inside the product space".format(state))
+
+    def __len__(self):
+        return self.n_states
+
+    def __getitem__(self, state_id):
+        if not 0 <= state_id < self.n_states:
+            raise IndexError("State ID {} out of range".format(state_id))
+        return self.decode(state_id)
+
+    def __eq__(self, other):
+        return isinstance(other, StateSpace) and self.to_dict() == other.to_dict()
+
+    def _regular_id(self, state):
+        if self._scalar:
+            low, high, multiplier = self._bounds[0]
+            if low <= state <= high:
+                return self._offset + state*multiplier
+            return None
+
+        if len(state) != len(self._bounds):
+            return None
+
+        state_id = self._offset
+        for value, (low, high, multiplier) in zip( state, self._bounds ):
+            if not low <= value <= high:
+                return None
+            state_id += value*multiplier
+        return state_id
+
+    def encode(self, state):
+        """
+        ID of a state, raises KeyError for states outside the space
+        """
+        state_id = self._regular_id(state)
+        if state_id is not None:
+            return state_id
+        return self._terminal_ids[state]
+
+    def decode(self, state_id):
+        """
+        State of an ID, a tuple (or a scalar for a single range)
+        """
+        if state_id >= self.n_regular_states:
+            return self.terminal_states[ state_id-self.n_regular_states ]
+
+        state = []
+        for dimension, size in zip( reversed(self.dimensions), reversed(self.sizes) ):
+            state_id, index = divmod( state_id, int(size) )
+            state.append( dimension[index] )
+
+        if self._scalar:
+            return state[0]
+        return tuple( reversed(state) )
+
+    def encode_batch(self, states):
+        """
+        IDs of a batch of states.
+
+        Parameters
+        ----------
+        states : array-like, shape (n_samples, n_dimensions) or (n_samples,) for scalar states
+
+        Returns
+        -------
+        ndarray of int, shape (n_samples,)
+        """
+        states = np.asarray(states).reshape( -1, len(self.dimensions) )
+        state_ids = self._offset + states @ self._multipliers
+
+        outside = np.any( (states < self._low) | (states > self._high), axis=1 )
+        for i in np.flatnonzero(outside):
+            state = states[i, 0] if self._scalar else tuple( states[i].tolist() )
+            state_ids[i] = self._terminal_ids[state]
+        return state_ids
+
+    def decode_batch(self, state_ids):
+        """
+        States of a batch of IDs, terminal states included when they are numeric
+        and have the same number of dimensions.
+
+        Returns
+        -------
+        ndarray, shape (n_samples, n_dimensions) or (n_samples,) for scalar states
+        """
+        state_ids = np.asarray(state_ids)
+        indices = np.array( np.unravel_index( np.minimum( state_ids, self.n_regular_states-1 ), self.sizes ) ).T
+        states = self._starts + indices*[ dimension.step for dimension in self.dimensions ]
+
+        terminal = state_ids >= self.n_regular_states
+        if np.any(terminal):
+            terminal_states = np.array( self.terminal_states ).reshape( len(self.terminal_states), -1 )
+            states[terminal] = terminal_states[ state_ids[terminal]-self.n_regular_states ]
+
+        if self._scalar:
+            return states[:, 0]
+        return states
+
+    def states(self):
+        """
+        All the states, in ID order
+        """
+        if self._scalar:
+            return list( self.dimensions[0] ) + self.terminal_states
+        return list( itertools.product( *self.dimensions ) ) + self.terminal_states
+
+    def to_dict(self):
+        return { "dimensions": [ [dimension.start, dimension.stop, dimension.step] for dimension in self.dimensions ],
+                 "scalar": self._scalar, "terminal_states": self.terminal_states }
+
+    @classmethod
+    def from_dict(cls, parameters, terminal_states):
+        dimensions = [ range(*dimension) for dimension in parameters["dimensions"] ]
+        if parameters["scalar"]:
+            dimensions = dimensions[0]
+        return cls( dimensions, terminal_states )
@@ -0,0 +1,162 @@
+import os
+import json
+import glob
+import random
+import hashlib
+import multiprocessing
+
+import numpy as np
+from sklearn.model_selection import ParameterGrid
+
+from RLearning.interfaces import TabularInterface
+from RLearning.instrumentation import Instrumentation, RECORD_FIELDS
+
+INTERFACE_PREFIX = "interface__"
+
+# Sweep being run, inherited by the forked workers instead of pickled,
+# so the method class and the factories may be lambdas or local functions
+_sweep = None
+
+def job_id(method_class, params, seed, episodes):
+    """
+    Stable ID of a job, the same across runs and processes
+    """
+    description = json.dumps( { "method": method_class.__qualname__, "params": params,
+                                 "seed": seed, "episodes": episodes }, sort_keys=True, default=str )
+    return hashlib.sha1( description.encode() ).hexdigest()[:16]
+
+def sweep_jobs(method_class, param_grid, seeds=(0,), episodes=100):
+    """
+    Jobs of a sweep, every configuration of the grid with every seed
+
+    Returns
+    -------
+    list of (job_id, params, seed)
+    """
+    return [ ( job_id( method_class, params, seed, episodes ), params, seed )
+             for params in ParameterGrid( param_grid ) for seed in seeds ]
+
+def run_sweep(method_class, make_environment, param_grid, output_dir, seeds=(0,), episodes=100,
+              make_interface=None, n_jobs=None):
+    """
+    Fit a method on every (configuration, seed) of a parameter grid, on a process pool.
+
+    Each job fits a fresh method, interface and environment, seeding the global random
+    generators with its seed, and saves its per-episode records as one ``<job_id>.npz``
+    shard in ``output_dir``: one array per field of ``RECORD_FIELDS`` and the job's
+    parameters and seed. Shards are written to a temporary file and renamed, so a shard
+    is either complete or absent. Jobs whose shard already exists are skipped, so an
+    interrupted sweep resumes by running it again with the same arguments.
+
+    Parameters
+    ----------
+    method_class : class
+        Method, e.g. SARSA or MonteCarlo
+    make_environment : callable
+        Builds the environment of a job, called without arguments
+    param_grid : dict or list of dict
+        Lists of values of the parameters, as sklearn's ParameterGrid.
+        Parameters prefixed with "interface__" are passed to make_interface,
+        e.g. "interface__alpha", the others to the method.
+    output_dir : str
+        Directory of the shards, created if needed. Use one directory per experiment,
+        the job IDs only depend on the method class, the parameters, the seed and the episodes.
+    seeds : list of int, optional
+        Seeds of each configuration, by default (0,)
+    episodes : int, optional
+        Episodes of each fit, by default 100
+    make_interface : callable or None, optional
+        Builds the interface of a job from the "interface__" parameters, by default None (TabularInterface)
+    n_jobs : int or None, optional
+        Number of worker processes, by default None (all the cores). With 1, jobs run in this process.
+        Pool workers can not start processes, so methods with n_jobs greater than 1 in the grid
+        need a sweep n_jobs of 1.
+
+    Returns
+    -------
+    list of str
+        IDs of the jobs run by this call, the skipped ones excluded
+    """
+    global _sweep
+
+    n_jobs = os.cpu_count() if n_jobs is None else n_jobs
+    all_jobs = sweep_jobs( method_class, param_grid, seeds, episodes )
+    if n_jobs != 1 and any( params.get( "n_jobs", 1 ) > 1 for _, params, _ in all_jobs ):
+        raise ValueError("Methods with n_jobs>1 start their own processes, which the sweep workers can not do. "
+                         "Run the sweep with n_jobs=1 or remove n_jobs from the parameter grid.")
+
+    os.makedirs( output_dir, exist_ok=True )
+    jobs = [ job for job in all_jobs if not os.path.exists( _shard_path( output_dir, job[0] ) ) ]
+
+    _sweep = ( method_class, make_environment, make_interface or TabularInterface, output_dir, episodes )
+    try:
+        if n_jobs == 1 or len(jobs) <= 1:
+            return [ _run_job( job ) for job in jobs ]
+
+        with multiprocessing.get_context( "fork" ).Pool( min( n_jobs, len(jobs) ) ) as pool:
+            return list( pool.imap_unordered( _run_job, jobs ) )
+    finally:
+        _sweep = None
+
+def _shard_path(output_dir, job_id):
+    return os.path.join( output_dir, job_id+".npz" )
+
+def _run_job(job):
+    method_class, make_environment, make_interface, output_dir, episodes = _sweep
+    job_id, params, seed = job
+
+    np.random.seed( seed )
+    random.seed( seed )
+
+    interface_params = { name[len(INTERFACE_PREFIX):]: value for name, value in params.items()
+                         if name.startswith( INTERFACE_PREFIX ) }
+    method_params = { name: value for name, value in params.items() if not name.startswith( INTERFACE_PREFIX ) }
+
+    instrumentation = Instrumentation()
+    method = method_class( env_interface=make_interface( **interface_params ), episodes=episodes,
+                           instrumentation=instrumentation, **method_params )
+    method.fit( make_environment() )
+
+    records = instrumentation.to_array()
+    columns = { field: records[field] for field, _ in RECORD_FIELDS }
+    columns["params"] = np.array( json.dumps( params, sort_keys=True, default=str ) )
+    columns["seed"] = np.array( seed )
+
+    path = _shard_path( output_dir, job_id )
+    with open( path+".tmp", "wb" ) as file:
+        np.savez( file, **columns )
+    os.replace( path+".tmp", path )
+    return job_id
+
+def load_results(output_dir):
+    """
+    Per-episode records of all the completed jobs of a sweep, as columns
+
+    Returns
+    -------
+    dict of ndarray
+        One row per episode of every job: "job_id", "seed", one column per parameter
+        (None where a job of a list of grids lacks it) and one per field of ``RECORD_FIELDS``
+    """
+    shards = sorted( glob.glob( os.path.join( output_dir, "*.npz" ) ) )
+
+    job_ids, seeds, params, records = [], [], [], []
+    for path in shards:
+        with np.load( path ) as shard:
+            n_episodes = len( shard["episode"] )
+            job_ids.append( np.repeat( os.path.basename(path)[:-len(".npz")], n_episodes ) )
+            seeds.append( np.repeat( int( shard["seed"] ), n_episodes ) )
+            params.append( ( json.loads( str( shard["params"] ) ), n_episodes ) )
+            records.append( { field: shard[field] for field, _ in RECORD_FIELDS } )
+
+    results = { "job_id": np.concatenate( job_ids ) if shards else np.array( [], dtype=str ),
+                "seed": np.concatenate( seeds ) if shards else np.array( [], dtype=int ) }
+
+    names = sorted( { name for job_params, _ in params for name in job_params } )
+    for name in names:
+        values = [ value for job_params, n_episodes in params for value in [ job_params.get( name ) ]*n_episodes ]
+        results[name] = np.array( values )
+
+    for field, dtype in RECORD_FIELDS:
+        results[field] = np.concatenate( [ record[field] for record in records ] ) if shards else np.array( [], dtype=dtype )
+    return results
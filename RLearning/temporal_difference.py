@@ -1,12 +1,16 @@
 from RLearning.base.base_methods import BaseMethod
-from RLearning.interfaces import TabularInterface
+from RLearning.interfaces import TabularInterface, SharedTabularInterface
+from RLearning.buffers import NStepBuffer, ReplayBuffer
 
 import collections
+import heapq
+import random
+import multiprocessing
 
 import numpy as np
 
 class SARSA(BaseMethod):
-  def __init__(self, *args, env_interface=TabularInterface(), eps=0.0, **kwargs):
+  def __init__(self, *args, env_interface=TabularInterface(), eps=0.0, n_jobs=1, random_state=None, **kwargs):
     """SARSA
 
     Parameters
@@ -15,32 +19,41 @@ class SARSA(BaseMethod):
         Interface between the agent and the environment, by default TabularInterface()
     eps : float, optional
         Eps probability for eps-greedy policy, by default 0.0
+    n_jobs : int, optional
+        Number of worker processes simulating the episodes, by default 1.
+        When greater than 1, only works with SharedTabularInterface: every worker runs
+        on its own copy of the environment and updates the shared tables without locks.
+    random_state : int or None, optional
+        Seed of the workers when n_jobs is greater than 1, by default None.
+        The results are not deterministic anyway, as the workers race on the tables.
     """
     self._eps = eps
     self.env_interface = env_interface
+    self.n_jobs = n_jobs
+    self.random_state = random_state
     super(SARSA, self).__init__(*args, **kwargs)
 
+  def fit(self, environment):
+    self.env_interface.fit( environment )
+    if self.n_jobs > 1:
+      _hogwild_fit( self )
+      return
+
+    self._run_episodes()
+
   def action( self, state ):
     if np.random.uniform( 0, 1 ) < self._eps:
         return self.env_interface.choose_random_action()
     return self.env_interface.choose_greedy_action(state) 
 
-  def fit(self, environment):
-    self.env_interface.fit( environment )
-
-    for episode in range( self.episodes ):
-      self.env_interface.initialize_environment()
-      self.simulate()
-
   def simulate(self):
     
     current_state = self.env_interface.state()
     current_action = self.action(current_state)
+    done = self.env_interface.is_terminal()
 
-    while not self.env_interface.is_terminal():
-      reward = self.env_interface.reward(current_action)
-
-      next_state = self.env_interface.state()
+    while not done:
+      next_state, reward, done = self.env_interface.step(current_action)
       next_action = self.action(next_state)
 
       self.state_value_update(reward, current_state, next_state)
@@ -59,20 +72,83 @@ class SARSA(BaseMethod):
     self.env_interface.update_control_value( current_state, current_action, target )
 
 class QLearning(SARSA):
-  def __init__(self, *args, **kwargs):
+  def __init__(self, *args, replay_capacity=None, batch_size=32, train_interval=1, **kwargs):
+    """Q-Learning
+
+    Parameters
+    ----------
+    replay_capacity : int or None, optional
+        Number of transitions kept in an experience replay buffer, by default None.
+        When None, the control values are updated online with every transition.
+        Otherwise, the transitions are stored and the control values are trained on
+        random minibatches of them, with one batched prediction and one batched update.
+        The state values are not updated in this mode.
+    batch_size : int, optional
+        Number of transitions in each minibatch, by default 32
+    train_interval : int, optional
+        Number of environment steps between two minibatch updates, by default 1
+
+    Other parameters are the ones of SARSA.
+    """
+    self.replay_capacity = replay_capacity
+    self.batch_size = batch_size
+    self.train_interval = train_interval
     super(QLearning, self).__init__(*args, **kwargs)
 
+  def fit(self, environment):
+    if self.replay_capacity is not None:
+      # The memory lasts for the whole fit, across episodes
+      self._replay_buffer = ReplayBuffer( self.replay_capacity )
+      self._n_transitions = 0
+
+    super(QLearning, self).fit( environment )
+
   def simulate(self):
+    if self.replay_capacity is not None:
+      self.replay_simulate()
+      return
+
     current_state = self.env_interface.state()
-    while not self.env_interface.is_terminal():
+    done = self.env_interface.is_terminal()
+    while not done:
       action = self.action(current_state)
-      reward = self.env_interface.reward(action)
-      next_state = self.env_interface.state()
+      next_state, reward, done = self.env_interface.step(action)
 
       self.state_value_update(reward, current_state, next_state)
       self.state_action_value_update(current_state, action, reward, next_state)
       current_state=next_state
 
+  def replay_simulate(self):
+    buffer = self._replay_buffer
+    current_state = self.env_interface.state()
+    done = self.env_interface.is_terminal()
+    while not done:
+      action = self.action(current_state)
+      next_state, reward, done = self.env_interface.step(action)
+      buffer.push( current_state, action, reward, next_state, done )
+
+      self._n_transitions += 1
+      if self._n_transitions%self.train_interval == 0 and len(buffer) >= self.batch_size:
+        self.replay_update()
+      current_state = next_state
+
+  def replay_update(self):
+    states, actions, rewards, next_states, dones = self._replay_buffer.sample( self.batch_size )
+
+    next_values = np.max( self.env_interface.get_states_action_values( next_states ), axis=1 )
+    targets = rewards + self.discount*np.where( dones, 0.0, next_values )
+
+    if not isinstance( self.env_interface, TabularInterface ):
+      self.env_interface.update_control_values( states, actions, targets )
+      return
+
+    # The tabular batched update expects unique pairs: the k-th occurrences of the pairs
+    # are updated together, in order, as sequential updates towards the same targets would
+    ranks = _occurrence_ranks( states*len( self.env_interface._actions ) + actions )
+    for rank in range( ranks.max()+1 ):
+      batch = ranks == rank
+      self.env_interface.update_control_values( states[batch], actions[batch], targets[batch] )
+
   def state_value_update(self, reward, current_state, next_state):
     target = reward+self.discount*np.max( self.env_interface.get_states_values() )
     self.env_interface.update_state_value(current_state, target)
@@ -83,6 +159,272 @@ class QLearning(SARSA):
 
     self.env_interface.update_control_value( current_state, action, target )
 
+class DynaQ(QLearning):
+  def __init__(self, *args, planning_steps=10, model="deterministic", **kwargs):
+    """Dyna-Q, Q-Learning plus planning updates on simulated transitions of a learned model.
+    Only works with TabularInterface, the model being arrays indexed by (state ID, action ID).
+
+    Parameters
+    ----------
+    planning_steps : int, optional
+        Number of planning updates after each real step, on (state, action) pairs sampled
+        from the visited ones, by default 10. Their targets are computed at once and the updates
+        are batched, a pair sampled more than once being updated again in a later batch.
+    model : str, optional
+        Learned model of the environment, by default "deterministic". Can be some of the options
+        {"deterministic", "sample"}. "deterministic" keeps the last next state and reward of each pair,
+        "sample" counts the next states of each pair, drawing them with the observed frequencies,
+        and uses the mean reward. Only the observed (pair, next state) transitions are stored.
+
+    Other parameters are the ones of QLearning, except for the replay buffer.
+    """
+    if model not in ("deterministic", "sample"):
+      raise ValueError("model should be 'deterministic' or 'sample'")
+    self.planning_steps = planning_steps
+    self.model = model
+    super(DynaQ, self).__init__(*args, **kwargs)
+
+    if self.replay_capacity is not None:
+      raise ValueError("DynaQ plans with its model, replay_capacity is not supported")
+
+  def fit(self, environment):
+    if not isinstance( self.env_interface, TabularInterface ):
+      raise ValueError("DynaQ only works with TabularInterface")
+
+    self.env_interface.fit( environment )
+    self._initialize_model()
+    if self.n_jobs > 1:
+      _hogwild_fit( self )
+      return
+
+    self._run_episodes()
+
+  def _initialize_model(self):
+    n_states = len( self.env_interface._states )
+    n_actions = len( self.env_interface._actions )
+    self._n_actions = n_actions
+
+    if self.model == "deterministic":
+      self._model_next_state = np.zeros( (n_states, n_actions), dtype=int )
+      self._model_reward = np.zeros( (n_states, n_actions) )
+    else:
+      self._model_reward_sum = np.zeros( (n_states, n_actions) )
+      self._model_visits = np.zeros( (n_states, n_actions) )
+
+      # Observed transitions, one slot per (pair, next state) in growing flat arrays,
+      # indexed by pair as in a CSR matrix when drawing
+      self._successor_slots = {}
+      self._successor_pairs = np.zeros( 64, dtype=int )
+      self._successor_states = np.zeros( 64, dtype=int )
+      self._successor_counts = np.zeros( 64 )
+      self._n_successors = 0
+      self._successor_offsets = None
+
+    # Visited pairs as flat IDs state_id*n_actions+action_id, with their position for O(1) insertion
+    self._visited_pairs = np.zeros( n_states*n_actions, dtype=int )
+    self._visited_position = np.full( n_states*n_actions, -1 )
+    self._n_visited = 0
+
+  def simulate(self):
+    current_state = self.env_interface.state()
+    done = self.env_interface.is_terminal()
+    while not done:
+      action = self.action(current_state)
+      next_state, reward, done = self.env_interface.step(action)
+
+      self.state_value_update(reward, current_state, next_state)
+      self.state_action_value_update(current_state, action, reward, next_state)
+      self.model_update(current_state, action, reward, next_state)
+      self.planning_update()
+      current_state=next_state
+
+  def model_update(self, state, action, reward, next_state):
+    pair = state*self._n_actions + action
+    if self._visited_position[pair] < 0:
+      self._visited_position[pair] = self._n_visited
+      self._visited_pairs[self._n_visited] = pair
+      self._n_visited += 1
+
+    if self.model == "deterministic":
+      self._model_next_state[state, action] = next_state
+      self._model_reward[state, action] = reward
+      return
+
+    slot = self._successor_slots.get( (pair, next_state) )
+    if slot is None:
+      slot = self._add_successor( pair, next_state )
+    self._successor_counts[slot] += 1
+    self._model_reward_sum[state, action] += reward
+    self._model_visits[state, action] += 1
+
+  def _add_successor(self, pair, next_state):
+    slot = self._n_successors
+    if slot == len( self._successor_pairs ):
+      self._successor_pairs = np.concatenate( (self._successor_pairs, np.zeros( slot, dtype=int )) )
+      self._successor_states = np.concatenate( (self._successor_states, np.zeros( slot, dtype=int )) )
+      self._successor_counts = np.concatenate( (self._successor_counts, np.zeros( slot )) )
+
+    self._successor_pairs[slot] = pair
+    self._successor_states[slot] = next_state
+    self._successor_slots[ (pair, next_state) ] = slot
+    self._n_successors += 1
+    # The index is rebuilt on the next draw
+    self._successor_offsets = None
+    return slot
+
+  def _successors(self, pairs):
+    """
+    Observed transitions of a batch of pairs: the number of next states of each pair
+    and their slots, grouped by pair in the batch order
+    """
+    if self._successor_offsets is None:
+      n_pairs = len( self._visited_position )
+      observed_pairs = self._successor_pairs[:self._n_successors]
+      self._successor_order = np.argsort( observed_pairs, kind="stable" )
+      self._successor_offsets = np.r_[ 0, np.cumsum( np.bincount( observed_pairs, minlength=n_pairs ) ) ]
+
+    starts = self._successor_offsets[pairs]
+    lengths = self._successor_offsets[pairs+1] - starts
+    batch_starts = np.cumsum(lengths) - lengths
+    positions = np.arange( lengths.sum() ) + np.repeat( starts-batch_starts, lengths )
+    return lengths, self._successor_order[positions]
+
+  def sample_model(self, states, actions):
+    """
+    Simulated next states and rewards of a batch of visited (state, action) pairs
+    """
+    if self.model == "deterministic":
+      return self._model_next_state[states, actions], self._model_reward[states, actions]
+
+    lengths, slots = self._successors( states*self._n_actions + actions )
+    counts = self._successor_counts[slots]
+    cumulative_counts = np.cumsum( counts )
+
+    # A draw in [0, visits) of each pair, offset by the counts of the pairs before it
+    batch_starts = np.cumsum(lengths) - lengths
+    visits = self._model_visits[states, actions]
+    draws = cumulative_counts[batch_starts] - counts[batch_starts] + np.random.uniform( 0, 1, size=len(states) )*visits
+    next_states = self._successor_states[ slots[ np.searchsorted( cumulative_counts, draws, side="right" ) ] ]
+    return next_states, self._model_reward_sum[states, actions]/visits
+
+  def planning_update(self):
+    if self.planning_steps <= 0 or self._n_visited == 0:
+      return
+
+    pairs = self._visited_pairs[ np.random.randint( 0, self._n_visited, size=self.planning_steps ) ]
+    states, actions = np.divmod( pairs, self._n_actions )
+
+    next_states, rewards = self.sample_model( states, actions )
+    targets = rewards + self.discount*np.max( self.env_interface.get_states_action_values( next_states ), axis=1 )
+
+    # The batched update expects unique pairs, the k-th samples of the pairs go together
+    ranks = _occurrence_ranks( pairs )
+    for rank in range( ranks.max()+1 ):
+      batch = ranks == rank
+      self.env_interface.update_control_values( states[batch], actions[batch], targets[batch] )
+
+class PrioritizedSweeping(DynaQ):
+  def __init__(self, *args, threshold=1e-4, **kwargs):
+    """Prioritized sweeping, Dyna-Q whose planning updates go to the pairs whose values would change the most.
+
+    The (state, action) pairs are kept in a heap keyed by the magnitude of their model TD error,
+    each pair queued at most once: a pair is pushed again only with a higher priority, the
+    older entry being skipped when popped. After a pair is updated, the pairs leading into
+    its state, found through a predecessor index, are queued with their new errors.
+
+    Parameters
+    ----------
+    threshold : float, optional
+        Smallest TD error magnitude for a pair to be queued, by default 1e-4
+
+    Other parameters are the ones of DynaQ, planning_steps being the maximum number
+    of queued pairs updated after each real step. With the "sample" model, the
+    updates are expected ones over the observed next states.
+    """
+    self.threshold = threshold
+    super(PrioritizedSweeping, self).__init__(*args, **kwargs)
+
+  def _initialize_model(self):
+    super(PrioritizedSweeping, self)._initialize_model()
+    n_states = len( self.env_interface._states )
+
+    # Flat pair IDs leading into each state
+    self._predecessors = [ set() for _ in range(n_states) ]
+    self._queue = []
+    self._queued_priority = np.zeros( n_states*self._n_actions )
+
+  def simulate(self):
+    current_state = self.env_interface.state()
+    done = self.env_interface.is_terminal()
+    while not done:
+      action = self.action(current_state)
+      next_state, reward, done = self.env_interface.step(action)
+
+      self.state_value_update(reward, current_state, next_state)
+      self.model_update(current_state, action, reward, next_state)
+      self.queue_pairs( np.array([current_state]), np.array([action]) )
+      self.planning_update()
+      current_state=next_state
+
+  def model_update(self, state, action, reward, next_state):
+    pair = state*self._n_actions + action
+    if self.model == "deterministic" and self._visited_position[pair] >= 0:
+      self._predecessors[ self._model_next_state[state, action] ].discard( pair )
+
+    super(PrioritizedSweeping, self).model_update(state, action, reward, next_state)
+    self._predecessors[next_state].add( pair )
+
+  def model_targets(self, states, actions):
+    """
+    Targets of a batch of visited (state, action) pairs under the model
+    """
+    if self.model == "deterministic":
+      next_states = self._model_next_state[states, actions]
+      next_values = np.max( self.env_interface.get_states_action_values( next_states ), axis=1 )
+      return self._model_reward[states, actions] + self.discount*next_values
+
+    lengths, slots = self._successors( states*self._n_actions + actions )
+    next_values = np.max( self.env_interface.get_states_action_values( self._successor_states[slots] ), axis=1 )
+
+    visits = self._model_visits[states, actions]
+    expected_values = np.bincount( np.repeat( np.arange(len(states)), lengths ),
+                                   weights=self._successor_counts[slots]*next_values, minlength=len(states) )/visits
+    return self._model_reward_sum[states, actions]/visits + self.discount*expected_values
+
+  def queue_pairs(self, states, actions):
+    values = self.env_interface.get_states_action_values( states )[ np.arange(len(states)), actions ]
+    priorities = np.abs( self.model_targets(states, actions) - values )
+    pairs = states*self._n_actions + actions
+
+    queued = ( priorities > self.threshold ) & ( priorities > self._queued_priority[pairs] )
+    for pair, priority in zip( pairs[queued].tolist(), priorities[queued].tolist() ):
+      self._queued_priority[pair] = priority
+      heapq.heappush( self._queue, (-priority, pair) )
+
+  def _pop_pair(self):
+    while self._queue:
+      priority, pair = heapq.heappop( self._queue )
+      if -priority == self._queued_priority[pair]:
+        self._queued_priority[pair] = 0.0
+        return pair
+      # Stale entry, the pair was queued again with a higher priority or already updated
+    return None
+
+  def planning_update(self):
+    for _ in range( self.planning_steps ):
+      pair = self._pop_pair()
+      if pair is None:
+        return
+
+      state, action = divmod( pair, self._n_actions )
+      target = self.model_targets( np.array([state]), np.array([action]) )[0]
+      self.env_interface.update_control_value( state, action, target )
+
+      predecessors = self._predecessors[state]
+      if predecessors:
+        states, actions = np.divmod( np.fromiter( predecessors, dtype=int, count=len(predecessors) ), self._n_actions )
+        self.queue_pairs( states, actions )
+
 class ExpectedSARSA(SARSA):
   def __init__(self, *args, **kwargs):
     """
@@ -98,22 +440,242 @@ class ExpectedSARSA(SARSA):
     self.env_interface.update_control_value( current_state, current_action, target )
 
   def _expected_reward_state( self, state ):
-    probas = np.array( [ self._state_action_proba(state, action) for action in range( len(self.env_interface._actions) ) ] )
-    rewards = np.array( [ self.env_interface.get_control_value(state, action) for action in range( len(self.env_interface._actions) ) ] )
-
-    return np.sum( probas*rewards )
-
-  def _state_action_proba(self, state, action):
     # This class is eps-greedy
     # p -> eps/|actions| for non-optimal actions
     # p -> 1-eps + eps/|actions| for the optimal action
-    probability = self._eps/len(self.env_interface._actions)
-    if self.env_interface.choose_greedy_action(state) == action:
-      probability += 1-self._eps
-    return probability
+    return self.env_interface.get_expected_value( state, self._eps )
+
+class SARSALambda(SARSA):
+  def __init__(self, *args, lambd=0.9, trace="accumulating", trace_cutoff=1e-4, **kwargs):
+    """SARSA(lambda), SARSA with eligibility traces over the control value weights.
+
+    Works with TabularInterface, whose table entries are the weights, and with
+    ApproximatedInterface on active feature indices (TileCoding(output="indices")
+    and SparseLinearApproximator). The traces are kept sparse, as a dict of the
+    features whose trace is above trace_cutoff, so each step costs time proportional
+    to the active traces instead of the number of weights.
+
+    Parameters
+    ----------
+    lambd : float, optional
+        Trace decay parameter, by default 0.9.
+        0 gives one-step SARSA and 1 gives Monte Carlo like updates
+    trace : str, optional
+        Trace mode, by default "accumulating". Can be some of the options {"accumulating", "replacing"}
+    trace_cutoff : float, optional
+        Traces that decay below this value are dropped, by default 1e-4
+
+    Other parameters are the ones of SARSA.
+    """
+    if trace not in ("accumulating", "replacing"):
+      raise ValueError("trace should be 'accumulating' or 'replacing'")
+    self.lambd = lambd
+    self.trace = trace
+    self.trace_cutoff = trace_cutoff
+    super(SARSALambda, self).__init__(*args, **kwargs)
+
+  # Values whose weights are traced
+  _traced_values = "control"
+
+  def fit(self, environment):
+    self.env_interface.fit( environment )
+    self.env_interface.check_linear_weights( self._traced_values )
+    if self.n_jobs > 1:
+      _hogwild_fit( self )
+      return
+
+    self._run_episodes()
+
+  def simulate(self):
+    traces = {}
+
+    current_state = self.env_interface.state()
+    current_action = self.action(current_state)
+    done = self.env_interface.is_terminal()
+
+    while not done:
+      next_state, reward, done = self.env_interface.step(current_action)
+      next_action = self.action(next_state)
+
+      target = reward
+      if not done:
+        target += self.discount*self.env_interface.get_control_value( next_state, next_action )
+      error = target - self.env_interface.get_control_value( current_state, current_action )
+
+      features = self.env_interface.get_control_features( current_state, current_action )
+      self._decay_traces( traces )
+      self._mark_traces( traces, features )
+      self._update_weights( traces, error, self.env_interface.get_control_step_size( features ) )
+
+      current_state=next_state
+      current_action=next_action
+
+  def _decay_traces(self, traces):
+    decay = self.discount*self.lambd
+    for feature, trace in list( traces.items() ):
+      trace *= decay
+      if trace < self.trace_cutoff:
+        del traces[feature]
+      else:
+        traces[feature] = trace
+
+  def _mark_traces(self, traces, features):
+    if self.trace == "replacing":
+      for feature in features.tolist():
+        traces[feature] = 1.0
+      return
+
+    for feature in features.tolist():
+      traces[feature] = traces.get( feature, 0.0 ) + 1.0
+
+  def _update_weights(self, traces, error, step_size):
+    features = np.fromiter( traces.keys(), dtype=int, count=len(traces) )
+    values = np.fromiter( traces.values(), dtype=float, count=len(traces) )
+    self.env_interface.update_control_weights( features, error*values, step_size=step_size )
+
+class TDLambda(SARSALambda):
+  def __init__(self, *args, **kwargs):
+    """TD(lambda), prediction of the state values with eligibility traces,
+    following the eps-greedy policy of the control values.
+    Only the state values are updated, the parameters are the ones of SARSALambda.
+    """
+    super(TDLambda, self).__init__(*args, **kwargs)
+
+  _traced_values = "state"
+
+  def simulate(self):
+    traces = {}
+
+    current_state = self.env_interface.state()
+    done = self.env_interface.is_terminal()
+
+    while not done:
+      action = self.action(current_state)
+      next_state, reward, done = self.env_interface.step(action)
+
+      target = reward
+      if not done:
+        target += self.discount*self.env_interface.get_state_value( next_state )
+      error = target - self.env_interface.get_state_value( current_state )
+
+      features = self.env_interface.get_state_features( current_state )
+      self._decay_traces( traces )
+      self._mark_traces( traces, features )
+      self._update_weights( traces, error, self.env_interface.get_state_step_size( features ) )
+
+      current_state=next_state
+
+  def _update_weights(self, traces, error, step_size):
+    features = np.fromiter( traces.keys(), dtype=int, count=len(traces) )
+    values = np.fromiter( traces.values(), dtype=float, count=len(traces) )
+    self.env_interface.update_state_weights( features, error*values, step_size=step_size )
+
+class TrueOnlineTDLambda(SARSA):
+  def __init__(self, *args, lambd=0.9, **kwargs):
+    """True online TD(lambda), prediction of the state values with a dutch trace,
+    following the eps-greedy policy of the control values.
+
+    Works on the flat weights of linear state values over active feature indices:
+    ApproximatedInterface with a state TileCoding(output="indices") and a
+    SparseLinearApproximator, or TabularInterface (one-hot features).
+    Each step costs O(active features): the trace is kept scaled,
+    :math:`z = s \\tilde{z}`, so its decay only changes :math:`s`, and the weights as
+    :math:`w = u + k \\tilde{z}`, so adding the trace to them only changes :math:`k`.
+    The touched weights are written back when the scale gets small and at the end of each episode.
+
+    Parameters
+    ----------
+    lambd : float, optional
+        Trace decay parameter, by default 0.9
+
+    Other parameters are the ones of SARSA.
+    """
+    self.lambd = lambd
+    super(TrueOnlineTDLambda, self).__init__(*args, **kwargs)
+
+  def fit(self, environment):
+    self.env_interface.fit( environment )
+    self.env_interface.check_linear_weights( "state" )
+    self._trace = np.zeros( len( self.env_interface.get_state_weights() ) )
+    if self.n_jobs > 1:
+      _hogwild_fit( self )
+      return
+
+    self._run_episodes()
+
+  def simulate(self):
+    interface = self.env_interface
+    weights = interface.get_state_weights()
+    trace = self._trace
+    decay = self.discount*self.lambd
+
+    # z = scale*trace and w = weights + trace_weight*trace, trace being zero out of the touched features
+    self._scale = 1.0
+    self._trace_weight = 0.0
+    self._touched = []
+    old_value = 0.0
+
+    state = interface.state()
+    done = interface.is_terminal()
+    if not done:
+      features = interface.get_state_features( state )
+      step_size = interface.get_state_step_size( features )
+      value = weights[features].sum()
+
+    while not done:
+      action = self.action(state)
+      state, reward, done = interface.step(action)
+
+      next_value = 0.0
+      if not done:
+        next_features = interface.get_state_features( state )
+        next_value = weights[next_features].sum() + self._trace_weight*trace[next_features].sum()
+      error = reward + self.discount*next_value - value
+
+      # z <- decay*z + (1 - step_size*decay*z.x) x
+      trace_dot = self._scale*trace[features].sum()
+      if self._scale*decay < 1e-8:
+        # Write the trace back before its scale vanishes, a zero decay clears it (TD(0))
+        self._fold_trace( weights, trace, keep=decay > 0 )
+      if decay > 0:
+        self._scale *= decay
+      increment = (1 - step_size*decay*trace_dot)/self._scale
+      trace[features] += increment
+      weights[features] -= self._trace_weight*increment
+      self._touched.append( features )
+
+      # w <- w + step_size*(error + value - old_value)*z - step_size*(value - old_value)*x
+      self._trace_weight += step_size*(error + value - old_value)*self._scale
+      weights[features] -= step_size*(value - old_value)
+
+      if not done:
+        old_value = next_value
+        features = next_features
+        value = weights[features].sum() + self._trace_weight*trace[features].sum()
+
+    self._fold_trace( weights, trace, keep=False )
+
+  def _fold_trace(self, weights, trace, keep):
+    """
+    Write the pending trace updates into the weights, keeping the trace rescaled or clearing it
+    """
+    if not self._touched:
+      return
+
+    touched = np.unique( np.concatenate( self._touched ) )
+    weights[touched] += self._trace_weight*trace[touched]
+    self._trace_weight = 0.0
+    if keep:
+      trace[touched] *= self._scale
+      self._touched = [ touched ]
+    else:
+      trace[touched] = 0.0
+      self._touched = []
+    self._scale = 1.0
 
 class NStepSarsa(BaseMethod):
-  def __init__(self, *args, env_interface=TabularInterface(), eps=0.0, n_steps=1, off_policy=False, **kwargs):
+  def __init__(self, *args, env_interface=TabularInterface(), eps=0.0, n_steps=1, off_policy=False, 
+               n_jobs=1, random_state=None, **kwargs):
     """N-Step SARSA
 
     Parameters
@@ -128,11 +690,18 @@ class NStepSarsa(BaseMethod):
     off_policy : bool, optional
         Whether or not to use off-policy. 
         If True, the behavior policy is the eps-greedy, while the target policy is deterministic.
+    n_jobs : int, optional
+        Number of worker processes simulating the episodes, by default 1.
+        When greater than 1, only works with SharedTabularInterface, see SARSA.
+    random_state : int or None, optional
+        Seed of the workers when n_jobs is greater than 1, by default None
     """
     self._eps = eps
     self.env_interface = env_interface
     self.n_steps = n_steps
     self.off_policy = off_policy
+    self.n_jobs = n_jobs
+    self.random_state = random_state
     super(NStepSarsa, self).__init__(*args, **kwargs)
   
   def action( self, state ):
@@ -142,148 +711,111 @@ class NStepSarsa(BaseMethod):
   
   def fit(self, environment):
     self.env_interface.fit( environment )
-    self.discounts = np.array( [self.discount**i for i in range(0, self.n_steps+1)], dtype=float )
-    
-    for episode in range( self.episodes ):
-      self.env_interface.initialize_environment()
-      self.simulate()
-
-  def simulate(self):
-    rewards = np.zeros( self.n_steps+1, dtype=float )
-    states =  [ None ]*( self.n_steps+1 )
-    actions = [ None ]*( self.n_steps+1 )
-    importance_sampling = [ None ]*( self.n_steps+1 )
-    time = 0
-
-    while not self.env_interface.is_terminal():
-      state = self.env_interface.state()
-      action = self.action(state)
-      reward = self.env_interface.reward(action)
-      relative_probability = self.relative_probability(state, action)
-
-      if time <= self.n_steps:
-        states[time] = state 
-        actions[time] = action
-        rewards[time] = reward
-        importance_sampling[time] = relative_probability
-        time+=1
-        continue
+    self._buffer = NStepBuffer( self.n_steps, self.discount )
+    if self.n_jobs > 1:
+      _hogwild_fit( self )
+      return
 
-      self.state_value_update( states, rewards, importance_sampling )
-      self.control_value_update( states, actions, rewards, importance_sampling )
-      rewards[:-1] = rewards[1:]
-      rewards[-1] = reward
+    self._run_episodes()
 
-      states[:-1] = states[1:]
-      states[-1] = state
+  def simulate(self):
+    buffer = self._buffer
+    buffer.clear()
 
-      actions[:-1] = actions[1:]
-      actions[-1] = action
+    state = self.env_interface.state()
+    done = self.env_interface.is_terminal()
+    while not done:
+      action = self.action(state)
 
-      importance_sampling[:-1] = importance_sampling[1:]
-      importance_sampling[-1] = relative_probability
+      if buffer.is_full():
+        # The oldest transition has its n-step window complete, bootstrapping from (state, action)
+        self.state_value_update( buffer, state )
+        self.control_value_update( buffer, state, action )
+        buffer.pop()
 
-      time+=1
+      next_state, reward, done = self.env_interface.step(action)
+      buffer.push( state, action, reward, self.relative_probability(state, action) )
+      state = next_state
 
     # Final updates after the episode's ending
-    while states[0] != None:
-      self.state_value_update( states, rewards, importance_sampling )
-      self.control_value_update( states, actions, rewards, importance_sampling )
-      rewards[:-1] = rewards[1:]
-      rewards[-1] = 0
-      states[:-1] = states[1:]
-      states[-1] = None
-      actions[:-1] = actions[1:]
-      actions[-1] = None
-      importance_sampling[:-1] = importance_sampling[1:]
-      importance_sampling[-1] = None
-
-  def state_value_update(self, states, rewards, samplings):
+    while len(buffer) > 0:
+      self.state_value_update( buffer )
+      self.control_value_update( buffer )
+      buffer.pop()
+
+  def state_value_update(self, buffer, last_state=None):
     if self.off_policy:
-      self.off_state_value_update( states, rewards, samplings )
+      self.off_state_value_update( buffer, last_state )
       return
-    self.on_state_value_update( states[0], rewards, states[-1] )
+    self.on_state_value_update( buffer, last_state )
 
-  def control_value_update(self, states, actions, rewards, samplings):
+  def control_value_update(self, buffer, last_state=None, last_action=None):
     if self.off_policy:
-      self.off_control_value_update( states, actions, rewards, samplings)
+      self.off_control_value_update( buffer, last_state, last_action )
       return
-    self.on_control_value_update( states[0], actions[0], rewards, states[-1], actions[-1] )
-
-  def off_state_value_update(self, states, rewards, samplings):
-    
-    target_G = 0
-    start_sum = False
+    self.on_control_value_update( buffer, last_state, last_action )
 
+  def off_state_value_update(self, buffer, last_state=None):
+    states, actions, rewards, samplings = buffer.ordered()
     state_target = states[0]
-    rewards = list( rewards )
-
-    for state, reward, p_sampling, time in reversed(list( zip(states, rewards, samplings, range(0, len(states)) ) )):
-      if state == None:
-        continue
 
-      if not start_sum:
-        # If the episode has not ended 
-        target_G = self.env_interface.get_state_value(state)
-        start_sum = True
-        continue
+    if last_state is None:
+      # The episode has ended, the newest buffered state closes the sum
+      target_G = self.env_interface.get_state_value( states[-1] )
+      times = reversed( range(0, len(states)-1) )
+    else:
+      target_G = self.env_interface.get_state_value( last_state )
+      times = reversed( range(0, len(states)) )
 
+    for time in times:
+      p_sampling = samplings[time]
       new_target_G = 0
-      new_target_G += p_sampling*(reward + self.discount*target_G)
-      new_target_G += (1-p_sampling)*self.env_interface.get_state_value(state)
+      new_target_G += p_sampling*(rewards[time] + self.discount*target_G)
+      new_target_G += (1-p_sampling)*self.env_interface.get_state_value( states[time] )
 
       target_G = new_target_G
 
     self.env_interface.update_state_value(state_target, target_G)
 
-  def off_control_value_update(self, states, actions, rewards, samplings):
-    target_G = 0
-    start_sum = False
-
+  def off_control_value_update(self, buffer, last_state=None, last_action=None):
+    states, actions, rewards, samplings = buffer.ordered()
     state_target = states[0]
     action_target = actions[0]
 
-    for state, action, reward, p_sampling, time in reversed(list(zip(states, actions, rewards, samplings, range(0, len(states))))):
-      if state == None:
-        continue
-      
-      if not start_sum:
-        # If the episode has not ended 
-        target_G = self.env_interface.get_control_value(state, action)
-        
-        # If the episode has ended
-        if time != len(states)-1:
-          target_G = reward
-        start_sum = True
-        continue
-      
+    if last_state is None:
+      # The episode has ended
+      target_G = rewards[-1]
+      times = reversed( range(0, len(states)-1) )
+    else:
+      target_G = self.env_interface.get_control_value( last_state, last_action )
+      times = reversed( range(0, len(states)) )
+
+    for time in times:
+      state, action = states[time], actions[time]
+
       new_target_G = 0
-      new_target_G += reward 
-      new_target_G += self.discount*p_sampling*(target_G - self.env_interface.get_control_value(state, action))
+      new_target_G += rewards[time] 
+      new_target_G += self.discount*samplings[time]*(target_G - self.env_interface.get_control_value(state, action))
       new_target_G += self.discount*self._expected_reward_state( state )
 
       target_G = new_target_G
 
     self.env_interface.update_control_value( state_target, action_target, target_G )
 
-  def on_state_value_update(self, state, rewards, last_state=None):
-    rewards_ = rewards.copy()
-    if last_state == None:
-      rewards_[-1] = 0
-    else:
-      rewards_[-1] = self.env_interface.get_state_value( last_state )
+  def on_state_value_update(self, buffer, last_state=None):
+    state, _ = buffer.oldest()
+    target = buffer.discounted_reward_sum()
+    if last_state is not None:
+      target += self.discount**self.n_steps*self.env_interface.get_state_value( last_state )
 
-    target = (self.discounts*rewards_).sum()
     self.env_interface.update_state_value( state, target )
 
-  def on_control_value_update(self, state, action, rewards, last_state=None, last_action=None):
-    rewards_ = rewards.copy()
-    if last_state == None:
-      rewards_[-1] = 0
-    else:
-      rewards_[-1] = self.env_interface.get_control_value( last_state, last_action )
+  def on_control_value_update(self, buffer, last_state=None, last_action=None):
+    state, action = buffer.oldest()
+    target = buffer.discounted_reward_sum()
+    if last_state is not None:
+      target += self.discount**self.n_steps*self.env_interface.get_control_value( last_state, last_action )
 
-    target = (self.discounts*rewards_).sum()
     self.env_interface.update_control_value( state, action, target )
 
   ## Off-Policy auxiliary methods
@@ -309,6 +841,47 @@ class NStepSarsa(BaseMethod):
     return probability
 
   def _expected_reward_state( self, state ):
-    probas = np.array( [ self.behavior_probability(state, action) for action in range( len(self.env_interface._actions) ) ] )
-    rewards = np.array( [ self.env_interface.get_control_value(state, action) for action in range( len(self.env_interface._actions) ) ] )
-    return np.sum( probas*rewards )
\ No newline at end of file
+    # Expectation under the eps-greedy behavior policy
+    return self.env_interface.get_expected_value( state, self._eps )
+
+def _occurrence_ranks(keys):
+  """
+  Number of earlier occurrences of each key in the array, e.g. [5, 3, 5, 5] -> [0, 0, 1, 2]
+  """
+  order = np.argsort( keys, kind="stable" )
+  sorted_keys = keys[order]
+  starts = np.flatnonzero( np.r_[ True, sorted_keys[1:] != sorted_keys[:-1] ] )
+  group_starts = np.repeat( starts, np.diff( np.r_[ starts, len(keys) ] ) )
+
+  ranks = np.empty( len(keys), dtype=int )
+  ranks[order] = np.arange( len(keys) ) - group_starts
+  return ranks
+
+def _hogwild_fit(method):
+  """
+  Split the episodes of a TD method between worker processes sharing its tables
+  """
+  if not isinstance( method.env_interface, SharedTabularInterface ):
+    raise ValueError("{} with n_jobs>1 only works with SharedTabularInterface".format( type(method).__name__ ))
+
+  worker_episodes = [ len(chunk) for chunk in np.array_split( np.arange(method.episodes), method.n_jobs ) ]
+  worker_seeds = [ int( child.generate_state(1)[0] ) for child in np.random.SeedSequence( method.random_state ).spawn( method.n_jobs ) ]
+  jobs = [ ( method, n_episodes, seed ) for n_episodes, seed in zip( worker_episodes, worker_seeds ) if n_episodes > 0 ]
+
+  with multiprocessing.Pool( len(jobs) ) as pool:
+    pool.starmap( _simulate_episodes, jobs )
+
+  # Racing updates may have left stale greedy actions
+  method.env_interface.refresh_policy()
+
+def _simulate_episodes(method, n_episodes, seed):
+  """
+  Worker of the Hogwild fit. The method arrives pickled, with its interface
+  attached to the shared tables and its own copy of the environment.
+  """
+  np.random.seed( seed )
+  random.seed( seed )
+
+  method.episodes = n_episodes
+  method.instrumentation = None
+  method._run_episodes()
@@ -0,0 +1,224 @@
+"""
+Throughput benchmarks of the learning methods on the environments.
+
+Each case fits a method on an environment with a fixed seed and reports the
+environment steps per second, the value updates per second and the peak
+memory allocated during the fit. Results are saved as JSON and compared
+against a stored baseline, flagging cases whose throughput dropped.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --cases sarsa --output results.json
+    python benchmarks/run_benchmarks.py --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+import numpy as np
+
+from RLearning.monte_carlo import MonteCarlo
+from RLearning.temporal_difference import SARSA, QLearning, ExpectedSARSA, NStepSarsa, SARSALambda
+from RLearning.interfaces import TabularInterface, ApproximatedInterface
+from RLearning.environment import RandomDiscreteWalk, WindyGridWorld, SimplifiedBlackjack, MontainCar
+from RLearning.feature_extraction import TileCoding
+from RLearning.approximators import SparseLinearApproximator
+from RLearning.instrumentation import Instrumentation
+
+BASELINE_PATH = os.path.join( os.path.dirname(__file__), 'baseline.json' )
+
+class TimeLimit():
+    """
+    Ends the episodes of an environment after a maximum number of steps,
+    so that poor initial policies can not stall a benchmark.
+    """
+    def __init__(self, environment, max_steps):
+        self.environment = environment
+        self.max_steps = max_steps
+
+    def __getattr__(self, name):
+        return getattr( self.environment, name )
+
+    def initialize(self):
+        self._steps = 0
+        self.environment.initialize()
+
+    def reward(self, action):
+        self._steps += 1
+        return self.environment.reward(action)
+
+    def step(self, action):
+        self._steps += 1
+        next_state, reward, done = self.environment.step(action)
+        return next_state, reward, done or self._steps >= self.max_steps
+
+    def is_terminal(self):
+        return self.environment.is_terminal() or self._steps >= self.max_steps
+
+def tabular(environment):
+    return TabularInterface( alpha=0.1 ), environment
+
+def tile_coded(environment):
+    tile_coding = TileCoding( n_bins=[10, 10, 3], limits=[ [-1.2, 0.5], [-0.07, 0.07], [-1, 1] ],
+                              n_tiles=8, tile_shift=[0.02, 0.0015, 0], output="indices" )
+    approximator = SparseLinearApproximator( n_features=10*10*3*8, alpha=0.1 )
+    interface = ApproximatedInterface( control_feature_extractor=tile_coding, control_value_approximator=approximator )
+    return interface, environment
+
+ENVIRONMENTS = {
+    'random_walk': ( lambda: TimeLimit( RandomDiscreteWalk( n_states=19 ), 1000 ), tabular, 200 ),
+    'windy_grid_world': ( lambda: TimeLimit( WindyGridWorld(), 1000 ), tabular, 50 ),
+    'blackjack': ( lambda: SimplifiedBlackjack(), tabular, 10000 ),
+    'mountain_car': ( lambda: TimeLimit( MontainCar(), 500 ), tile_coded, 5 ),
+}
+
+METHODS = {
+    'monte_carlo': lambda **kwargs: MonteCarlo( eps=0.1, **kwargs ),
+    'sarsa': lambda **kwargs: SARSA( eps=0.1, **kwargs ),
+    'qlearning': lambda **kwargs: QLearning( eps=0.1, **kwargs ),
+    'qlearning_replay': lambda **kwargs: QLearning( eps=0.1, replay_capacity=10000, batch_size=64, train_interval=4, **kwargs ),
+    'expected_sarsa': lambda **kwargs: ExpectedSARSA( eps=0.1, **kwargs ),
+    'nstep_sarsa_1': lambda **kwargs: NStepSarsa( eps=0.1, n_steps=1, **kwargs ),
+    'nstep_sarsa_8': lambda **kwargs: NStepSarsa( eps=0.1, n_steps=8, **kwargs ),
+    'nstep_sarsa_64': lambda **kwargs: NStepSarsa( eps=0.1, n_steps=64, **kwargs ),
+    'nstep_sarsa_8_off': lambda **kwargs: NStepSarsa( eps=0.1, n_steps=8, off_policy=True, **kwargs ),
+    'sarsa_lambda_0.9': lambda **kwargs: SARSALambda( eps=0.1, lambd=0.9, **kwargs ),
+}
+
+def cases():
+    for method_name in METHODS:
+        for environment_name in ENVIRONMENTS:
+            yield '{}/{}'.format( method_name, environment_name ), method_name, environment_name
+
+def run_case(method_name, environment_name, seed=0, trace_memory=False):
+    make_environment, make_interface, episodes = ENVIRONMENTS[environment_name]
+    np.random.seed( seed )
+    random.seed( seed )
+
+    interface, environment = make_interface( make_environment() )
+    instrumentation = Instrumentation()
+    method = METHODS[method_name]( env_interface=interface, episodes=episodes, instrumentation=instrumentation )
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    method.fit( environment )
+    elapsed = time.perf_counter() - start
+    peak_memory = 0
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    summary = instrumentation.summary()
+    return {
+        'episodes': episodes,
+        'steps': summary['steps'],
+        'updates': summary['updates'],
+        'seconds': elapsed,
+        'steps_per_second': summary['steps']/elapsed,
+        'updates_per_second': summary['updates']/elapsed,
+        'peak_memory_bytes': peak_memory,
+    }
+
+def run(selected=None, seed=0, repeat=3):
+    results = {}
+    for name, method_name, environment_name in cases():
+        if selected and not any( pattern in name for pattern in selected ):
+            continue
+
+        # Same seed on every repetition, the fastest one is kept to reduce timing noise
+        result = min( [ run_case( method_name, environment_name, seed ) for _ in range(repeat) ],
+                      key=lambda result: result['seconds'] )
+        # Memory is traced in a separate run, tracemalloc slows the allocations down
+        result['peak_memory_bytes'] = run_case( method_name, environment_name, seed, trace_memory=True )['peak_memory_bytes']
+        results[name] = result
+
+        print( '{:40s} {:>12,.0f} steps/s {:>12,.0f} updates/s {:>10,.1f} KiB'.format(
+               name, result['steps_per_second'], result['updates_per_second'], result['peak_memory_bytes']/1024 ) )
+    return results
+
+def missing(results, baseline):
+    """
+    Cases that have no baseline to be compared against.
+    """
+    return [ name for name in results if name not in baseline ]
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Cases whose steps per second dropped more than ``tolerance`` relative to the baseline.
+    Cases missing from the baseline are not compared, see :func:`missing`.
+    """
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = result['steps_per_second']/baseline[name]['steps_per_second']
+        if ratio < 1-tolerance:
+            regressions[name] = ratio
+    return regressions
+
+def metadata(seed, repeat):
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter )
+    parser.add_argument( '--cases', nargs='*', help='Run only the cases whose name contains one of these strings' )
+    parser.add_argument( '--seed', type=int, default=0 )
+    parser.add_argument( '--repeat', type=int, default=3, help='Timed runs of each case, the fastest is kept' )
+    parser.add_argument( '--output', default='benchmark_results.json', help='Where to save the results' )
+    parser.add_argument( '--baseline', default=BASELINE_PATH, help='Baseline results to compare against' )
+    parser.add_argument( '--tolerance', type=float, default=0.25, help='Relative throughput drop flagged as a regression' )
+    parser.add_argument( '--save-baseline', action='store_true',
+                         help='Store the results as the new baseline, with --cases only the selected cases are replaced' )
+    args = parser.parse_args(argv)
+
+    results = run( args.cases, args.seed, args.repeat )
+    report = { 'metadata': metadata(args.seed, args.repeat), 'results': results }
+
+    with open( args.output, 'w' ) as file:
+        json.dump( report, file, indent=2 )
+
+    if args.save_baseline:
+        if args.cases and os.path.exists( args.baseline ):
+            with open( args.baseline ) as file:
+                baseline = json.load( file )['results']
+            baseline.update( results )
+            report = { 'metadata': report['metadata'], 'results': baseline }
+
+        with open( args.baseline, 'w' ) as file:
+            json.dump( report, file, indent=2 )
+        return 0
+
+    if not os.path.exists( args.baseline ):
+        print( 'No baseline found at {}'.format( args.baseline ) )
+        return 0
+
+    with open( args.baseline ) as file:
+        baseline = json.load( file )['results']
+
+    for name in missing( results, baseline ):
+        print( 'NO BASELINE {}: run with --save-baseline to record it'.format( name ) )
+
+    regressions = compare( results, baseline, args.tolerance )
+    for name, ratio in regressions.items():
+        print( 'REGRESSION {}: {:.0%} of the baseline throughput'.format( name, ratio ) )
+
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit( main() )
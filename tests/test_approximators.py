@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+from RLearning.approximators import SparseLinearApproximator
+from RLearning.feature_extraction import TileCoding
+
+import numpy as np
+
+class TestSparseLinearApproximator(unittest.TestCase):
+    def test_indices_match_dense(self):
+        tile_coding = TileCoding( n_bins=[10, 4], limits=[[0,1], [1,2]], n_tiles=3, tile_shift=[0.1, 0.5] ).fit()
+        X = np.random.uniform( size=(20, 2) )
+        y = np.random.normal( size=20 )
+
+        dense_approximator = SparseLinearApproximator( alpha=0.5 )
+        indices_approximator = SparseLinearApproximator( n_features=tile_coding.n_features_out_, alpha=0.5 )
+        for i in range(len(X)):
+            dense_approximator.partial_fit( tile_coding.transform( X[i:i+1] ), y[i:i+1] )
+            indices_approximator.partial_fit( tile_coding.transform_indices( X[i:i+1] ), y[i:i+1] )
+
+        self.assertTrue( np.allclose( dense_approximator.weights, indices_approximator.weights ) )
+        self.assertTrue( np.allclose( dense_approximator.predict( tile_coding.transform(X) ),
+                                      indices_approximator.predict( tile_coding.transform_indices(X) ) ) )
+
+    def test_partial_fit_reaches_target(self):
+        approximator = SparseLinearApproximator( n_features=10, alpha=1.0 )
+        X = np.array( [[0, 5]] )
+
+        approximator.partial_fit( X, [3.0] )
+
+        self.assertAlmostEqual( approximator.predict( X )[0], 3.0 )
+
+    def test_indices_require_n_features(self):
+        approximator = SparseLinearApproximator()
+
+        with self.assertRaises( ValueError ):
+            approximator.partial_fit( np.array( [[0, 5]] ), [1.0] )
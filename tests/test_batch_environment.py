@@ -0,0 +1,97 @@
+import os
+import sys
+import unittest
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+from RLearning.batch_environment import BatchKBanditsProblem, BatchRandomDiscreteWalk, BatchWindyGridWorld, BatchSimplifiedBlackjack, BatchMontainCar
+from RLearning.environment import MontainCar
+from RLearning.interfaces import ApproximatedInterface
+from RLearning.feature_extraction import TileCoding
+from RLearning.approximators import SparseLinearApproximator
+
+import numpy as np
+
+class TestBatchEnvironments(unittest.TestCase):
+    def test_step_shapes(self):
+        n_envs = 8
+        environments = [ BatchKBanditsProblem( n_envs=n_envs, seed=0 ),
+                         BatchRandomDiscreteWalk( n_states=5, n_envs=n_envs, seed=0 ),
+                         BatchWindyGridWorld( n_envs=n_envs, seed=0 ),
+                         BatchSimplifiedBlackjack( n_envs=n_envs, seed=0 ),
+                         BatchMontainCar( n_envs=n_envs, seed=0 ) ]
+
+        for environment in environments:
+            states = environment.state()
+            next_states, rewards, dones = environment.step( np.zeros( n_envs, dtype=int ) )
+
+            self.assertEqual( next_states.shape, states.shape )
+            self.assertEqual( rewards.shape, (n_envs,) )
+            self.assertEqual( dones.shape, (n_envs,) )
+
+    def test_auto_reset(self):
+        environment = BatchRandomDiscreteWalk( n_states=3, step_size=2, n_envs=64, seed=0 )
+
+        for step in range(20):
+            next_states, rewards, dones = environment.step( np.zeros( 64, dtype=int ) )
+            self.assertTrue( np.all( next_states[dones] == environment.terminal_state ) )
+            self.assertTrue( np.all( rewards[~dones] == 0 ) )
+            self.assertTrue( np.all( environment.state()[dones] == 1 ) )
+
+    def test_blackjack_default_start(self):
+        environment = BatchSimplifiedBlackjack( exploring_starts=False, n_envs=100, seed=0 )
+        states = environment.state()
+
+        self.assertTrue( np.all( (states[:,0] >= 12) & (states[:,0] <= 21) ) )
+
+    def test_windy_grid_world_same_seed(self):
+        actions = np.random.randint( 0, 4, size=(50, 16) )
+        environment_a = BatchWindyGridWorld( n_envs=16, seed=42 )
+        environment_b = BatchWindyGridWorld( n_envs=16, seed=42 )
+
+        for action_ids in actions:
+            environment_a.step( action_ids )
+            environment_b.step( action_ids )
+
+        self.assertTrue( np.all( environment_a.state() == environment_b.state() ) )
+
+    def test_mountain_car_matches_single_car(self):
+        environment = BatchMontainCar( n_envs=4, seed=0 )
+        cars = [ MontainCar() for _ in range(4) ]
+        for car, (position, velocity) in zip( cars, environment.state() ):
+            car.initialize()
+            car._position, car._velocity = position, velocity
+
+        for action_ids in np.random.randint( 0, 3, size=(200, 4) ):
+            next_states, rewards, dones = environment.step( action_ids )
+            for car, action_id, next_state, reward in zip( cars, action_ids, next_states, rewards ):
+                self.assertEqual( car.reward( car.actions[action_id] ), reward )
+                self.assertTrue( np.allclose( car.state(), next_state ) )
+
+    def test_mountain_car_batched_semi_gradient_sarsa(self):
+        n_envs = 32
+        environment = BatchMontainCar( n_envs=n_envs, seed=0 )
+        tc_ext = TileCoding( n_bins=[10, 10, 3], limits=[ [-1.2, 0.5], [-0.07, 0.07], [-1, 1] ],
+                             n_tiles=4, tile_shift=[0.04, 0.003, 0], output="indices" )
+        app_interface = ApproximatedInterface( control_feature_extractor=tc_ext,
+                                               control_value_approximator=SparseLinearApproximator( n_features=1200, alpha=0.1 ) )
+        app_interface.fit( environment )
+
+        actions = np.array( environment.actions )
+        states = environment.state()
+        action_ids = np.argmax( app_interface.get_states_action_values( states ), axis=1 )
+        for step in range(50):
+            next_states, rewards, dones = environment.step( action_ids )
+            next_action_ids = np.argmax( app_interface.get_states_action_values( next_states ), axis=1 )
+            next_values = app_interface.get_states_action_values( next_states )[ np.arange(n_envs), next_action_ids ]
+
+            targets = rewards + np.where( dones, 0, next_values )
+            app_interface.update_control_values( states, actions[action_ids], targets )
+
+            # Finished cars start over from the reset states
+            states = environment.state()
+            action_ids = np.where( dones, np.argmax( app_interface.get_states_action_values( states ), axis=1 ), next_action_ids )
+
+        # Every step costs -1, so the learned values go negative
+        self.assertTrue( np.all( np.isfinite( app_interface.control_value_approximator.weights ) ) )
+        self.assertLess( app_interface.get_states_action_values( states ).mean(), 0 )
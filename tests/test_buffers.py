@@ -0,0 +1,102 @@
+import os
+import sys
+import unittest
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+from RLearning.buffers import TrajectoryBuffer, NStepBuffer, ReplayBuffer, discounted_returns
+
+import numpy as np
+
+class TestDiscountedReturns(unittest.TestCase):
+    def test_match_backward_loop(self):
+        rewards = np.random.normal( size=50 )
+        discount = 0.9
+
+        expected = np.zeros( len(rewards) )
+        cumulative_return = 0.0
+        for time in reversed( range(len(rewards)) ):
+            cumulative_return = cumulative_return*discount + rewards[time]
+            expected[time] = cumulative_return
+
+        self.assertTrue( np.allclose( discounted_returns( rewards, discount ), expected ) )
+
+    def test_empty_episode(self):
+        self.assertEqual( len( discounted_returns( [], 0.5 ) ), 0 )
+
+class TestTrajectoryBuffer(unittest.TestCase):
+    def test_grow(self):
+        trajectory = TrajectoryBuffer( capacity=2 )
+        for time in range(10):
+            trajectory.append( [time, -time], time%3, float(time) )
+
+        self.assertEqual( len(trajectory), 10 )
+        self.assertEqual( trajectory.states.shape, (10, 2) )
+        self.assertTrue( (trajectory.actions == np.arange(10)%3).all() )
+        self.assertTrue( (trajectory.rewards == np.arange(10)).all() )
+
+    def test_clear(self):
+        trajectory = TrajectoryBuffer()
+        trajectory.append( 1, 0, 1.0 )
+        trajectory.clear()
+        trajectory.append( 2, 1, -1.0 )
+
+        self.assertEqual( trajectory.states.tolist(), [2] )
+
+class TestNStepBuffer(unittest.TestCase):
+    def test_rolling_sum_match_window(self):
+        n_steps = 5
+        discount = 0.9
+        buffer = NStepBuffer( n_steps, discount )
+        rewards = np.random.normal( size=37 )
+
+        for time, reward in enumerate(rewards):
+            if buffer.is_full():
+                window = rewards[time-n_steps:time]
+                expected = np.sum( window*discount**np.arange(n_steps) )
+                self.assertAlmostEqual( buffer.discounted_reward_sum(), expected )
+                self.assertEqual( buffer.oldest()[0], time-n_steps )
+                buffer.pop()
+            buffer.push( time, 0, reward )
+
+        while len(buffer) > 0:
+            window = rewards[len(rewards)-len(buffer):]
+            self.assertAlmostEqual( buffer.discounted_reward_sum(), np.sum( window*discount**np.arange(len(window)) ) )
+            buffer.pop()
+
+    def test_vector_states(self):
+        buffer = NStepBuffer( 3 )
+        for time in range(3):
+            buffer.push( np.array([time, 0.5]), 1, 1.0 )
+
+        states, actions, rewards, samplings = buffer.ordered()
+        self.assertEqual( len(states), 3 )
+        self.assertTrue( (states[0] == np.array([0, 0.5])).all() )
+
+class TestReplayBuffer(unittest.TestCase):
+    def test_overwrite_oldest(self):
+        buffer = ReplayBuffer( capacity=4 )
+        for time in range(6):
+            buffer.push( np.array([time, -time]), time%3, float(time), np.array([time+1, -time-1]), time == 5 )
+
+        self.assertTrue( buffer.is_full() )
+        self.assertEqual( len(buffer), 4 )
+        self.assertEqual( sorted( buffer._rewards.tolist() ), [2.0, 3.0, 4.0, 5.0] )
+
+    def test_sample_rows_match(self):
+        buffer = ReplayBuffer( capacity=100 )
+        for time in range(10):
+            buffer.push( time, time%2, 10.0*time, time+1, time == 9 )
+
+        states, actions, rewards, next_states, dones = buffer.sample( 32 )
+        self.assertEqual( states.shape, (32,) )
+        self.assertTrue( (rewards == 10.0*states).all() )
+        self.assertTrue( (next_states == states+1).all() )
+        self.assertTrue( (dones == (states == 9)).all() )
+
+        states, _, _, _, _ = buffer.sample( 10, replace=False )
+        self.assertEqual( sorted( states.tolist() ), list(range(10)) )
+
+    def test_sample_empty(self):
+        with self.assertRaises( ValueError ):
+            ReplayBuffer().sample( 1 )
@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+from RLearning.dynamic_programming import policy_evaluation, value_iteration, policy_iteration, action_values
+from RLearning.environment import RandomDiscreteWalk, WindyGridWorld, SimplifiedBlackjack, KBanditsProblem
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+class TestDynamicProgramming(unittest.TestCase):
+    def test_transition_rows_are_distributions( self ):
+        for environment in [ RandomDiscreteWalk( n_states=11, step_size=2 ), WindyGridWorld(), SimplifiedBlackjack(), KBanditsProblem() ]:
+            transitions, rewards = environment.transition_model()
+            n_states, n_actions = rewards.shape
+            self.assertEqual( transitions.shape, (n_states*n_actions, n_states) )
+
+            row_sums = np.asarray( transitions.sum(axis=1) ).reshape( n_states, n_actions )
+            terminal_id = environment.states.index( environment.terminal_state )
+            np.testing.assert_allclose( np.delete( row_sums, terminal_id, axis=0 ), 1.0 )
+            np.testing.assert_array_equal( row_sums[terminal_id], 0.0 )
+
+    def test_random_walk_evaluation( self ):
+        environment = RandomDiscreteWalk( n_states=19, step_size=3 )
+        transitions, rewards = environment.transition_model()
+        policy = np.zeros( len(environment.states), dtype=int )
+
+        true_values = environment.compute_true_solution()
+        np.testing.assert_allclose( policy_evaluation( transitions, rewards, policy ), true_values, atol=1e-10 )
+        np.testing.assert_allclose( policy_evaluation( transitions, rewards, policy, method="iterative", tol=1e-12 ),
+                                    true_values, atol=1e-8 )
+
+    def test_random_walk_true_solution_cached( self ):
+        environment = RandomDiscreteWalk( n_states=2000, step_size=7 )
+        transitions, rewards = environment.transition_model()
+        true_values = environment.compute_true_solution()
+
+        np.testing.assert_allclose( policy_evaluation( transitions, rewards, np.zeros( 2001, dtype=int ) ), true_values, atol=1e-9 )
+        # Solved once per parameters and shared between walks
+        self.assertIs( RandomDiscreteWalk( n_states=2000, step_size=7 ).true_state_values, true_values )
+        self.assertFalse( true_values.flags.writeable )
+
+    def test_value_and_policy_iteration_agree( self ):
+        transitions, rewards = SimplifiedBlackjack().transition_model()
+        vi_values, vi_policy = value_iteration( transitions, rewards )
+        pi_values, pi_policy = policy_iteration( transitions, rewards )
+
+        np.testing.assert_allclose( vi_values, pi_values, atol=1e-8 )
+        np.testing.assert_array_equal( vi_policy, pi_policy )
+        # Bellman optimality
+        np.testing.assert_allclose( action_values( transitions, rewards, vi_values ).max(axis=1), vi_values, atol=1e-8 )
+
+    def test_windy_grid_world_shortest_path( self ):
+        environment = WindyGridWorld()
+        values, policy = value_iteration( *environment.transition_model() )
+
+        environment.initialize()
+        episode_return = 0
+        while not environment.is_terminal():
+            state_id = environment.states.index( environment.state() )
+            episode_return += environment.reward( environment.actions[ policy[state_id] ] )
+
+        self.assertEqual( episode_return, values[ environment.states.index( (3, 0) ) ] )
+
+    def test_improper_policy_raises( self ):
+        environment = WindyGridWorld()
+        transitions, rewards = environment.transition_model()
+        with self.assertRaises( ValueError ):
+            policy_evaluation( transitions, rewards, np.zeros( len(environment.states), dtype=int ) )
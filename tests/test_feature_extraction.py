@@ -135,6 +135,41 @@ class TestTileCoding(unittest.TestCase):
         self.assertEqual( no_zeros_X.max(), n_tiles )
         self.assertEqual( no_zeros_X.max(), no_zeros_X.min() )
 
+    def test_output_indices_match_dense(self):
+        nbins=[20, 20]
+        n_tiles = 8
+        limits = [[-1.2, 0.5], [-0.07, 0.07]]
+        tile_shift = [0.02, 0.001]
+        X = np.random.uniform( low=[-1.2, -0.07], high=[0.5, 0.07], size=(50, 2) )
+
+        dense = TileCoding(n_bins=nbins, limits=limits, n_tiles=n_tiles, tile_shift=tile_shift).fit()
+        indices = TileCoding(n_bins=nbins, limits=limits, n_tiles=n_tiles, tile_shift=tile_shift, output="indices").fit()
+        X_dense = dense.transform(X)
+        X_indices = indices.transform(X)
+
+        self.assertEqual( X_indices.shape, (len(X), n_tiles) )
+        self.assertTrue( np.all( X_dense[ np.arange(len(X))[:,None], X_indices ] == 1 ) )
+
+    def test_output_sparse_match_dense(self):
+        nbins=[10, 4]
+        tile_coding = TileCoding(n_bins=nbins, limits=[[0,1], [1,2]], n_tiles=3, tile_shift=[0.1, 0.5]).fit()
+        sparse_coding = TileCoding(n_bins=nbins, limits=[[0,1], [1,2]], n_tiles=3, tile_shift=[0.1, 0.5], output="sparse").fit()
+        X = np.array( [[0.5, 1.1],
+                       [0.1, 20 ],
+                       [0.2, 0.3],] )
+
+        self.assertEqual( np.abs( sparse_coding.transform(X).toarray()-tile_coding.transform(X) ).sum(), 0 )
+
+    def test_output_preallocated(self):
+        tile_coding = TileCoding(n_bins=[10, 4], limits=[[0,1], [1,2]], n_tiles=3, tile_shift=[0.1, 0.5]).fit()
+        X = np.random.uniform( size=(7, 2) )
+        out = np.ones( (7, 120) )
+
+        X_transformed = tile_coding.transform(X, out=out)
+
+        self.assertIs( X_transformed, out )
+        self.assertEqual( np.abs( out-tile_coding.transform(X) ).sum(), 0 )
+
 class TestDummyRepeaterr(unittest.TestCase):
     def test_output_(self):
         rep_extractor = DummyRepeater()
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+from RLearning.instrumentation import Instrumentation
+from RLearning.temporal_difference import SARSA
+from RLearning.monte_carlo import MonteCarlo
+from RLearning.interfaces import TabularInterface
+from RLearning.environment import RandomDiscreteWalk
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+class TestInstrumentation(unittest.TestCase):
+    def test_counters_and_records( self ):
+        episodes_seen = []
+        instrumentation = Instrumentation( timers=True, callbacks=[ lambda method, record: episodes_seen.append( record['episode'] ) ] )
+        method = SARSA( env_interface=TabularInterface( alpha=0.1 ), eps=0.1, episodes=20, instrumentation=instrumentation )
+        method.fit( RandomDiscreteWalk( n_states=5 ) )
+
+        records = instrumentation.to_array()
+        self.assertEqual( len(records), 20 )
+        self.assertEqual( episodes_seen, list(range(20)) )
+        # SARSA makes one state and one control update per step
+        np.testing.assert_array_equal( records['updates'], 2*records['steps'] )
+        self.assertTrue( np.all( records['steps'] > 0 ) )
+
+        summary = instrumentation.summary()
+        self.assertEqual( summary['steps'], records['steps'].sum() )
+        self.assertLessEqual( summary['environment_fraction']+summary['interface_fraction']+summary['update_fraction'], 1.0+1e-9 )
+
+    def test_wrappers_removed_after_fit( self ):
+        interface = TabularInterface()
+        method = MonteCarlo( env_interface=interface, episodes=5, instrumentation=Instrumentation( timers=True ) )
+        method.fit( RandomDiscreteWalk( n_states=5 ) )
+
+        self.assertFalse( 'reward' in vars(interface) )
+        self.assertFalse( 'update_state_values' in vars(interface) )
+
+    def test_same_results_as_plain_fit( self ):
+        state_action_values = []
+        for instrumentation in [ None, Instrumentation( timers=True ) ]:
+            np.random.seed(0)
+            method = SARSA( env_interface=TabularInterface( alpha=0.1 ), eps=0.1, episodes=20, instrumentation=instrumentation )
+            method.fit( RandomDiscreteWalk( n_states=5 ) )
+            state_action_values.append( method.env_interface.state_action_value )
+
+        np.testing.assert_array_equal( state_action_values[0], state_action_values[1] )
@@ -1,11 +1,13 @@
 import os
 import sys
+import pickle
+import tempfile
 import unittest
 
 sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
 
-from RLearning.interfaces import TabularInterface, ApproximatedInterface
-from RLearning.environment import RandomDiscreteWalk, Random1000StateWalk
+from RLearning.interfaces import TabularInterface, ApproximatedInterface, SharedTabularInterface
+from RLearning.environment import RandomDiscreteWalk, Random1000StateWalk, MontainCar, SimplifiedBlackjack
 
 from sklearn.linear_model import SGDRegressor
 from RLearning.feature_extraction import TileCoding
@@ -37,6 +39,91 @@ class TestTabularInterface(unittest.TestCase):
 
         tabular_interface.reward( 0 )
 
+    def test_step(self):
+        tabular_interface = TabularInterface()
+        environment = RandomDiscreteWalk( n_states=3 )
+        tabular_interface.fit( environment )
+        tabular_interface.initialize_environment()
+
+        done = False
+        while not done:
+            next_state, reward, done = tabular_interface.step( 0 )
+            # The fused call sees the terminal state as soon as it is reached
+            self.assertEqual( next_state, tabular_interface.state() )
+            self.assertEqual( done, tabular_interface.is_terminal() )
+        self.assertEqual( next_state, environment.states.index( environment.terminal_state ) )
+        self.assertIn( reward, [-1, 1] )
+
+    def test_greedy_cache(self):
+        tabular_interface = TabularInterface( alpha=0.5 )
+        environment = SimplifiedBlackjack()
+        tabular_interface.fit( environment )
+        n_states = len(environment.states)
+
+        for update in range(2000):
+            tabular_interface.update_control_value( np.random.randint(0, n_states), np.random.randint(0, 2), np.random.choice([-1, 0, 1]) )
+            if update%100 == 0:
+                state_ids = np.random.randint(0, n_states, size=10)
+                tabular_interface.update_control_values( np.unique(state_ids), np.zeros(len(np.unique(state_ids)), dtype=int), 0.5 )
+
+        greedy_actions = np.argmax( tabular_interface.state_action_value, axis=1 )
+        self.assertTrue( (tabular_interface.policy == greedy_actions).all() )
+        self.assertEqual( tabular_interface.choose_greedy_action(3), greedy_actions[3] )
+
+    def test_eps_greedy_expectation(self):
+        tabular_interface = TabularInterface()
+        tabular_interface.fit( SimplifiedBlackjack() )
+        tabular_interface.state_action_value[:] = np.random.normal( size=tabular_interface.state_action_value.shape )
+        tabular_interface.refresh_policy()
+
+        state_ids = np.arange(20)
+        probabilities = tabular_interface.get_states_action_probabilities( state_ids, 0.1 )
+        expected_values = np.sum( probabilities*tabular_interface.state_action_value[state_ids], axis=1 )
+
+        self.assertTrue( np.allclose( probabilities.sum(axis=1), 1 ) )
+        self.assertTrue( np.allclose( tabular_interface.get_expected_values( state_ids, 0.1 ), expected_values ) )
+        self.assertAlmostEqual( tabular_interface.get_expected_value( 5, 0.1 ), expected_values[5] )
+
+    def test_save_load(self):
+        tabular_interface = TabularInterface( alpha=0.5 )
+        environment = SimplifiedBlackjack()
+        tabular_interface.fit( environment )
+        tabular_interface.update_control_value( 7, 1, 1.0 )
+        tabular_interface.update_state_value( 7, -1.0 )
+
+        with tempfile.TemporaryDirectory() as path:
+            tabular_interface.save( path )
+            loaded_interface = TabularInterface().load( path, mmap_mode='c' )
+
+            self.assertEqual( loaded_interface.alpha, 0.5 )
+            self.assertTrue( np.array_equal( loaded_interface.state_action_value, tabular_interface.state_action_value ) )
+            self.assertTrue( np.array_equal( loaded_interface.state_value, tabular_interface.state_value ) )
+            self.assertEqual( loaded_interface.choose_greedy_action(7), 1 )
+            self.assertEqual( loaded_interface.get_state_id( environment.states[7] ), 7 )
+
+            # Fitting resumes from the loaded tables, once
+            loaded_interface.fit( environment )
+            self.assertEqual( loaded_interface.get_control_value( 7, 1 ), 0.5 )
+            loaded_interface.fit( environment )
+            self.assertEqual( loaded_interface.get_control_value( 7, 1 ), 0.0 )
+
+            with self.assertRaises( ValueError ):
+                TabularInterface().load( path ).fit( RandomDiscreteWalk() )
+
+    def test_shared_tables(self):
+        shared_interface = SharedTabularInterface( alpha=0.5 )
+        shared_interface.fit( SimplifiedBlackjack() )
+
+        # A pickled copy, as received by a worker, writes on the same tables
+        copy = pickle.loads( pickle.dumps( shared_interface ) )
+        copy.update_control_value( 3, 1, 2.0 )
+        self.assertEqual( shared_interface.get_control_value( 3, 1 ), 1.0 )
+        self.assertEqual( shared_interface.choose_greedy_action( 3 ), 1 )
+        copy.close()
+
+        shared_interface.close()
+        self.assertEqual( shared_interface.get_control_value( 3, 1 ), 1.0 )
+
 class TestApproximatedInterface(unittest.TestCase):
     
     def test_fit_control(self):
@@ -73,4 +160,51 @@ class TestApproximatedInterface(unittest.TestCase):
         app_interface.fit( environment )
         app_interface.initialize_environment()
         app_interface.reward( 0 )
-    
\ No newline at end of file
+    
+    def test_state_action_values_batched(self):
+        sgd_reg =  SGDRegressor()
+        tc_ext = TileCoding( n_bins=[10, 10, 3], limits=[ [-1.2, 0.5], [-0.07, 0.07], [-1, 1] ], n_tiles=2, tile_shift=[0.05, 0.01, 0] )
+        app_interface = ApproximatedInterface( control_feature_extractor=tc_ext,
+                                               control_value_approximator=sgd_reg
+                                             )
+        environment = MontainCar()
+        app_interface.fit( environment )
+        for action in environment.actions:
+            app_interface.update_control_value( [-0.5, 0.01], action, action )
+
+        states = [ [-0.5, 0.01], [0.2, -0.03], [-1.0, 0.0] ]
+        values = app_interface.get_states_action_values( states )
+        expected = [ [ app_interface.get_control_value(state, action) for action in environment.actions ] for state in states ]
+
+        self.assertTrue( np.allclose( values, expected ) )
+        self.assertEqual( app_interface.choose_greedy_actions( states ).shape, (len(states),) )
+        self.assertEqual( app_interface.choose_greedy_actions( states )[0], app_interface.choose_greedy_action( states[0] ) )
+
+        probabilities = app_interface.get_action_probabilities( states[0], 0.3 )
+        self.assertAlmostEqual( app_interface.get_expected_value( states[0], 0.3 ), np.dot( probabilities, expected[0] ) )
+
+    def test_save_load(self):
+        def build_interface():
+            tc_ext = TileCoding( n_bins=[10, 10, 3], limits=[ [-1.2, 0.5], [-0.07, 0.07], [-1, 1] ], n_tiles=2, tile_shift=[0.05, 0.01, 0] )
+            return ApproximatedInterface( control_feature_extractor=tc_ext, control_value_approximator=SGDRegressor() )
+
+        app_interface = build_interface()
+        environment = MontainCar()
+        app_interface.fit( environment )
+        for action in environment.actions:
+            app_interface.update_control_value( [-0.5, 0.01], action, action )
+
+        with tempfile.TemporaryDirectory() as path:
+            app_interface.save( path )
+            loaded_interface = build_interface().load( path )
+            loaded_interface.fit( environment )
+
+        state = [-0.5, 0.01]
+        self.assertTrue( np.allclose( loaded_interface.get_state_action_values( state ), app_interface.get_state_action_values( state ) ) )
+
+        # The learning rate schedule continues where it stopped
+        approximator, loaded_approximator = app_interface.control_value_approximator, loaded_interface.control_value_approximator
+        self.assertEqual( loaded_approximator.t_, approximator.t_ )
+        app_interface.update_control_value( state, 1, 5.0 )
+        loaded_interface.update_control_value( state, 1, 5.0 )
+        self.assertTrue( np.allclose( loaded_approximator.coef_, approximator.coef_ ) )
@@ -1,15 +1,20 @@
 import os
 import sys
+import copy
 import unittest
 
+import numpy as np
+
 from RLearning.monte_carlo import MonteCarlo
-from RLearning.temporal_difference import SARSA, QLearning, ExpectedSARSA, NStepSarsa
+from RLearning.temporal_difference import SARSA, QLearning, DynaQ, PrioritizedSweeping, ExpectedSARSA, NStepSarsa, SARSALambda, TDLambda, TrueOnlineTDLambda
 
-from RLearning.interfaces import ApproximatedInterface
-from RLearning.environment import RandomDiscreteWalk, Random1000StateWalk
+from RLearning.interfaces import ApproximatedInterface, TabularInterface, SharedTabularInterface
+from RLearning.environment import RandomDiscreteWalk, Random1000StateWalk, MontainCar, SimplifiedBlackjack, WindyGridWorld
 
 from sklearn.linear_model import SGDRegressor
 from RLearning.feature_extraction import TileCoding
+from RLearning.approximators import SparseLinearApproximator
+from RLearning.instrumentation import Instrumentation
 
 sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
 
@@ -30,6 +35,16 @@ class TestMC(unittest.TestCase):
         mc_method = MonteCarlo( env_interface=app_interface, episodes=100 )
         mc_method.fit( envrioment )
 
+    def test_mc_parallel_deterministic( self ):
+        state_action_values = []
+        for run in range(2):
+            mc_method = MonteCarlo( env_interface=TabularInterface( alpha_decay="inverse-state" ), episodes=200, 
+                                    n_jobs=2, sync_interval=50, random_state=0 )
+            mc_method.fit( RandomDiscreteWalk( n_states=5 ) )
+            state_action_values.append( mc_method.env_interface.state_action_value.copy() )
+
+        self.assertTrue( (state_action_values[0] == state_action_values[1]).all() )
+
 
 class TestSARSA( unittest.TestCase ):
     def test_sarsa_tabular_integration( self ):
@@ -48,6 +63,15 @@ class TestSARSA( unittest.TestCase ):
         sarsa = SARSA( env_interface=app_interface, episodes=100 )
         sarsa.fit( envrioment )
 
+    def test_sarsa_sparse_linear_integration( self ):
+        tc_ext = TileCoding( n_bins=[100, 1], limits=[ [0, 1000+1], [0,0] ], tile_shift=[0,0], output="indices" )
+        app_interface = ApproximatedInterface( control_feature_extractor=tc_ext,
+                                               control_value_approximator=SparseLinearApproximator( n_features=100 )
+                                             )
+        envrioment = Random1000StateWalk()
+        sarsa = SARSA( env_interface=app_interface, episodes=100 )
+        sarsa.fit( envrioment )
+
 
 class TestQLearning( unittest.TestCase ):
     def test_ql_tabular_integration( self ):
@@ -66,6 +90,148 @@ class TestQLearning( unittest.TestCase ):
         qlearning.fit( envrioment )
 
 
+    def test_ql_replay( self ):
+        np.random.seed( 0 )
+        ql_method = QLearning( env_interface=TabularInterface( alpha=0.5 ), eps=0.1, episodes=100,
+                               replay_capacity=1000, batch_size=16, train_interval=2 )
+        ql_method.fit( RandomDiscreteWalk() )
+        self.assertGreater( len(ql_method._replay_buffer), 16 )
+
+        tile_coding = TileCoding( n_bins=[10, 10, 3], limits=[ [-1.2, 0.5], [-0.07, 0.07], [-1, 1] ],
+                                  n_tiles=4, tile_shift=[0.02, 0.0015, 0], output="indices" )
+        app_interface = ApproximatedInterface( control_feature_extractor=tile_coding,
+                                               control_value_approximator=SparseLinearApproximator( n_features=10*10*3*4, alpha=0.1 ) )
+        ql_method = QLearning( env_interface=app_interface, eps=0.1, episodes=1,
+                               replay_capacity=5000, batch_size=64, train_interval=4 )
+        ql_method.fit( MontainCar() )
+        self.assertTrue( np.all( np.isfinite( app_interface.control_value_approximator.weights ) ) )
+
+    def test_ql_replay_duplicates( self ):
+        for alpha_decay in ["constant", "inverse-state"]:
+            np.random.seed( 0 )
+            interface = TabularInterface( alpha=0.5, alpha_decay=alpha_decay )
+            # A tiny buffer and a large batch repeat the same pairs, training only when called
+            ql_method = QLearning( env_interface=interface, eps=0.1, episodes=5,
+                                   replay_capacity=3, batch_size=16, train_interval=10**9 )
+            ql_method.fit( RandomDiscreteWalk( n_states=5 ) )
+            interface.state_action_value[:] = np.random.normal( size=interface.state_action_value.shape )
+            interface.refresh_policy()
+
+            np.random.seed( 1 )
+            states, actions, rewards, next_states, dones = ql_method._replay_buffer.sample( 16 )
+            next_values = np.max( interface.get_states_action_values( next_states ), axis=1 )
+            targets = rewards + np.where( dones, 0.0, next_values )
+
+            reference = copy.deepcopy( interface )
+            for state, action, target in zip( states, actions, targets ):
+                reference.update_control_value( state, action, target )
+
+            np.random.seed( 1 )
+            ql_method.replay_update()
+            self.assertTrue( np.allclose( interface.state_action_value, reference.state_action_value ) )
+            self.assertTrue( (interface._state_action_count == reference._state_action_count).all() )
+            self.assertTrue( (interface.policy == reference.policy).all() )
+
+    def test_ql_hogwild( self ):
+        shared_interface = SharedTabularInterface( alpha=0.1 )
+        ql_method = QLearning( env_interface=shared_interface, eps=0.1, episodes=400, n_jobs=2, random_state=0 )
+        ql_method.fit( SimplifiedBlackjack() )
+
+        # The workers' updates are visible to the parent
+        self.assertTrue( np.abs( shared_interface.state_action_value ).sum() > 0 )
+        self.assertTrue( ( shared_interface.policy == np.argmax( shared_interface.state_action_value, axis=1 ) ).all() )
+        shared_interface.close()
+
+        with self.assertRaises( ValueError ):
+            QLearning( env_interface=TabularInterface(), episodes=10, n_jobs=2 ).fit( SimplifiedBlackjack() )
+
+def greedy_episode_length( interface, max_steps=100 ):
+    interface.initialize_environment()
+    state = interface.state()
+    length = 0
+    while not interface.is_terminal() and length < max_steps:
+        state, _, _ = interface.step( interface.choose_greedy_action(state) )
+        length += 1
+    return length
+
+class TestDynaQ( unittest.TestCase ):
+    def test_dyna_windy_grid_world( self ):
+        np.random.seed( 0 )
+        interface = TabularInterface( alpha=0.5 )
+        dyna_method = DynaQ( env_interface=interface, eps=0.1, episodes=10, planning_steps=50 )
+        dyna_method.fit( WindyGridWorld() )
+
+        self.assertLessEqual( greedy_episode_length( interface ), 20 )
+        visited = dyna_method._visited_pairs[:dyna_method._n_visited]
+        self.assertEqual( len(np.unique(visited)), len(visited) )
+
+    def test_dyna_planning_steps( self ):
+        # Every sampled pair is updated, repeated ones included
+        np.random.seed( 0 )
+        instrumentation = Instrumentation()
+        dyna_method = DynaQ( env_interface=TabularInterface( alpha=0.5 ), eps=0.1, episodes=5,
+                             planning_steps=50, instrumentation=instrumentation )
+        dyna_method.fit( WindyGridWorld() )
+
+        summary = instrumentation.summary()
+        # One state value and one control value update per real step, plus the planning ones
+        self.assertEqual( summary['updates'], summary['steps']*(2+50) )
+
+    def test_dyna_sample_model( self ):
+        np.random.seed( 0 )
+        dyna_method = DynaQ( env_interface=TabularInterface( alpha=0.1 ), eps=0.1, episodes=200,
+                             planning_steps=5, model="sample" )
+        dyna_method.fit( SimplifiedBlackjack() )
+
+        n_successors = dyna_method._n_successors
+        pairs = dyna_method._successor_pairs[:n_successors]
+        counts = dyna_method._successor_counts[:n_successors]
+        visits = dyna_method._model_visits.reshape(-1)
+        self.assertTrue( (np.bincount( pairs, weights=counts, minlength=len(visits) ) == visits).all() )
+
+        # The draws follow the observed frequencies of the next states
+        pair = pairs[ np.argmax( np.bincount( pairs ) ) ]
+        state, action = divmod( pair, 2 )
+        next_states, _ = dyna_method.sample_model( np.full( 20000, state ), np.full( 20000, action ) )
+        observed = dyna_method._successor_states[:n_successors][ pairs == pair ]
+        frequencies = counts[ pairs == pair ]/visits[pair]
+        for next_state, frequency in zip( observed, frequencies ):
+            self.assertAlmostEqual( np.mean( next_states == next_state ), frequency, delta=0.02 )
+        self.assertTrue( np.isin( next_states, observed ).all() )
+
+    def test_dyna_requires_tabular( self ):
+        app_interface = ApproximatedInterface( control_feature_extractor=TileCoding( n_bins=[10, 1], limits=[ [0, 1001], [0, 0] ], tile_shift=[0, 0] ),
+                                               control_value_approximator=SGDRegressor() )
+        with self.assertRaises( ValueError ):
+            DynaQ( env_interface=app_interface ).fit( Random1000StateWalk() )
+
+class TestPrioritizedSweeping( unittest.TestCase ):
+    def test_ps_windy_grid_world( self ):
+        np.random.seed( 0 )
+        interface = TabularInterface( alpha=1.0 )
+        ps_method = PrioritizedSweeping( env_interface=interface, eps=0.1, episodes=10, planning_steps=50 )
+        ps_method.fit( WindyGridWorld() )
+
+        self.assertLessEqual( greedy_episode_length( interface ), 20 )
+
+        # Every queued pair has exactly one live heap entry
+        live = [ pair for priority, pair in ps_method._queue if -priority == ps_method._queued_priority[pair] ]
+        self.assertEqual( len(live), len(set(live)) )
+        self.assertEqual( sorted(live), np.flatnonzero( ps_method._queued_priority ).tolist() )
+
+        # The predecessors match the deterministic model
+        for pair in ps_method._visited_pairs[:ps_method._n_visited]:
+            state, action = divmod( pair, 4 )
+            self.assertIn( pair, ps_method._predecessors[ ps_method._model_next_state[state, action] ] )
+
+    def test_ps_sample_model( self ):
+        np.random.seed( 0 )
+        interface = TabularInterface( alpha=0.5 )
+        ps_method = PrioritizedSweeping( env_interface=interface, eps=0.1, episodes=50,
+                                         planning_steps=10, model="sample" )
+        ps_method.fit( RandomDiscreteWalk( n_states=9 ) )
+        self.assertTrue( np.all( np.isfinite( interface.state_action_value ) ) )
+
 class TestExpectedSARSA( unittest.TestCase ):
     def test_exp_sarsa_tabular_integration( self ):
         sarsa = ExpectedSARSA( episodes=100 )
@@ -109,4 +275,112 @@ class TestNStepSarsa( unittest.TestCase ):
     def test_nstep_sarsa_tabular_off_policy( self ):
         sarsa = NStepSarsa( episodes=100, n_steps=1, off_policy=True, eps=0.1 )
         envrioment = RandomDiscreteWalk()
-        sarsa.fit( envrioment )
\ No newline at end of file
+        sarsa.fit( envrioment )
+
+    def test_nstep_sarsa_vector_states( self ):
+        tc_ext = TileCoding( n_bins=[10, 10, 3], limits=[ [-1.2, 0.5], [-0.07, 0.07], [-1, 1] ], 
+                             n_tiles=4, tile_shift=[0.04, 0.003, 0], output="indices" )
+        app_interface = ApproximatedInterface( control_feature_extractor=tc_ext,
+                                               control_value_approximator=SparseLinearApproximator( n_features=1200, alpha=0.5 )
+                                             )
+        sarsa = NStepSarsa( env_interface=app_interface, episodes=2, n_steps=64 )
+        sarsa.fit( MontainCar() )
+
+class TestEligibilityTraces( unittest.TestCase ):
+    def fit( self, method, environment, seed=0 ):
+        np.random.seed( seed )
+        method.fit( environment )
+        return method.env_interface
+
+    def test_lambda_zero_match_one_step( self ):
+        environment = RandomDiscreteWalk( n_states=7 )
+        td_interface = self.fit( TDLambda( env_interface=TabularInterface( alpha=0.2 ), lambd=0.0, episodes=20 ), environment )
+        nstep_interface = self.fit( NStepSarsa( env_interface=TabularInterface( alpha=0.2 ), n_steps=1, episodes=20 ), environment )
+        self.assertTrue( np.allclose( td_interface.state_value, nstep_interface.state_value ) )
+
+        environment = SimplifiedBlackjack()
+        lambda_interface = self.fit( SARSALambda( env_interface=TabularInterface( alpha=0.1 ), eps=0.1, lambd=0.0, episodes=200 ), environment )
+        sarsa_interface = self.fit( SARSA( env_interface=TabularInterface( alpha=0.1 ), eps=0.1, episodes=200 ), environment )
+        self.assertTrue( np.allclose( lambda_interface.state_action_value, sarsa_interface.state_action_value ) )
+        self.assertTrue( (lambda_interface.policy == np.argmax( lambda_interface.state_action_value, axis=1 )).all() )
+
+    def test_td_lambda_random_walk( self ):
+        environment = RandomDiscreteWalk( n_states=19 )
+        errors = {}
+        for lambd in [0.0, 0.8]:
+            rms = []
+            for seed in range(10):
+                interface = self.fit( TDLambda( env_interface=TabularInterface( alpha=0.2 ), lambd=lambd, episodes=10 ), environment, seed )
+                rms.append( np.sqrt( np.mean( (interface.state_value-environment.true_state_values)**2 ) ) )
+            errors[lambd] = np.mean(rms)
+        self.assertLess( errors[0.8], errors[0.0] )
+
+    def test_sarsa_lambda_tile_coding( self ):
+        for trace in ["accumulating", "replacing"]:
+            tile_coding = TileCoding( n_bins=[10, 10, 3], limits=[ [-1.2, 0.5], [-0.07, 0.07], [-1, 1] ],
+                                      n_tiles=8, tile_shift=[0.02, 0.0015, 0], output="indices" )
+            app_interface = ApproximatedInterface( control_feature_extractor=tile_coding,
+                                                   control_value_approximator=SparseLinearApproximator( n_features=10*10*3*8, alpha=0.3 ) )
+            self.fit( SARSALambda( env_interface=app_interface, lambd=0.9, trace=trace, episodes=2 ), MontainCar() )
+
+            weights = app_interface.control_value_approximator.weights
+            self.assertTrue( np.all( np.isfinite(weights) ) )
+            self.assertLess( weights.min(), 0 )
+
+    def test_linear_weights_required( self ):
+        sgd_interface = ApproximatedInterface( control_feature_extractor=TileCoding( n_bins=[10, 1], limits=[ [0, 1001], [0, 0] ], tile_shift=[0, 0], output="indices" ),
+                                               control_value_approximator=SGDRegressor() )
+        with self.assertRaises( ValueError ):
+            SARSALambda( env_interface=sgd_interface, episodes=1 ).fit( Random1000StateWalk() )
+
+        dense_interface = ApproximatedInterface( control_feature_extractor=TileCoding( n_bins=[10, 1], limits=[ [0, 1001], [0, 0] ], tile_shift=[0, 0] ),
+                                                 control_value_approximator=SparseLinearApproximator( n_features=10 ) )
+        with self.assertRaises( ValueError ):
+            SARSALambda( env_interface=dense_interface, episodes=1 ).fit( Random1000StateWalk() )
+
+        # No state value approximator
+        for method_class in [TDLambda, TrueOnlineTDLambda]:
+            with self.assertRaises( ValueError ):
+                method_class( env_interface=dense_interface, episodes=1 ).fit( Random1000StateWalk() )
+
+    def test_true_online_match_dense( self ):
+        environment = RandomDiscreteWalk( n_states=19 )
+        alpha = 0.3
+        for lambd in [0.0, 0.9]:
+            interface = self.fit( TrueOnlineTDLambda( env_interface=TabularInterface( alpha=alpha ), lambd=lambd, episodes=30 ), environment )
+
+            # Dense true online TD(lambda) on one-hot features, same random draws
+            np.random.seed( 0 )
+            reference = TabularInterface( alpha=alpha ).fit( environment )
+            n_states = len( reference.state_value )
+            weights = np.zeros( n_states )
+            for episode in range(30):
+                reference.initialize_environment()
+                state = reference.state()
+                features = np.eye( n_states )[state]
+                trace = np.zeros( n_states )
+                old_value = 0.0
+                done = reference.is_terminal()
+                while not done:
+                    np.random.uniform( 0, 1 )
+                    state, reward, done = reference.step( 0 )
+                    next_features = np.zeros( n_states ) if done else np.eye( n_states )[state]
+                    value, next_value = weights @ features, weights @ next_features
+                    error = reward + next_value - value
+                    trace = lambd*trace + (1 - alpha*lambd*(trace @ features))*features
+                    weights = weights + alpha*(error + value - old_value)*trace - alpha*(value - old_value)*features
+                    old_value, features = next_value, next_features
+
+            self.assertTrue( np.allclose( interface.state_value, weights ) )
+
+    def test_true_online_tile_coding( self ):
+        state_tiles = TileCoding( n_bins=[20], limits=[ [0, 1000] ], n_tiles=4, tile_shift=[12.5], output="indices" )
+        control_tiles = TileCoding( n_bins=[2, 1], limits=[ [0, 1000], [0, 0] ], tile_shift=[0, 0], output="indices" )
+        app_interface = ApproximatedInterface( control_feature_extractor=control_tiles,
+                                               control_value_approximator=SparseLinearApproximator( n_features=2, alpha=0.0 ),
+                                               state_feature_extractor=state_tiles,
+                                               state_value_approximator=SparseLinearApproximator( n_features=20*4, alpha=0.2 ) )
+        self.fit( TrueOnlineTDLambda( env_interface=app_interface, lambd=0.8, episodes=30 ), Random1000StateWalk() )
+
+        self.assertLess( app_interface.get_state_value( 100 ), 0 )
+        self.assertGreater( app_interface.get_state_value( 900 ), 0 )
@@ -0,0 +1,51 @@
+import os
+import sys
+import itertools
+import unittest
+
+import numpy as np
+
+from RLearning.state_space import StateSpace
+from RLearning.interfaces import TabularInterface
+from RLearning.environment import SimplifiedBlackjack, WindyGridWorld, RandomDiscreteWalk
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+class TestStateSpace(unittest.TestCase):
+    def test_product_order( self ):
+        state_space = StateSpace( [ range(12, 22), range(1, 11), range(1, -1, -1) ], [ (-1, -1, -1) ] )
+        states = list( itertools.product( range(12, 22), range(1, 11), [1, 0] ) ) + [ (-1, -1, -1) ]
+
+        self.assertEqual( state_space.states(), states )
+        self.assertEqual( [ state_space.encode(state) for state in states ], list(range(len(states))) )
+        self.assertEqual( [ state_space.decode(state_id) for state_id in range(len(states)) ], states )
+
+    def test_batched( self ):
+        state_space = StateSpace( [ range(7), range(10) ], [ (-1, -1) ] )
+        state_ids = np.random.randint( 0, len(state_space), size=50 )
+
+        states = state_space.decode_batch( state_ids )
+        self.assertEqual( states.shape, (50, 2) )
+        np.testing.assert_array_equal( state_space.encode_batch( states ), state_ids )
+
+    def test_scalar_states( self ):
+        state_space = StateSpace( range(5), [-1] )
+        self.assertEqual( state_space.encode(-1), 5 )
+        self.assertEqual( state_space.decode(3), 3 )
+        np.testing.assert_array_equal( state_space.encode_batch( [0, 4, -1] ), [0, 4, 5] )
+
+    def test_invalid_states( self ):
+        state_space = StateSpace( [ range(7), range(10) ], [ (-1, -1) ] )
+        with self.assertRaises( KeyError ):
+            state_space.encode( (7, 0) )
+        with self.assertRaises( ValueError ):
+            StateSpace( [ range(7), range(10) ], [ (0, 0) ] )
+
+    def test_interface_without_lookup_tables( self ):
+        for environment in [ SimplifiedBlackjack(), WindyGridWorld(), RandomDiscreteWalk( n_states=7 ) ]:
+            tabular_interface = TabularInterface().fit( environment )
+            self.assertIsNone( tabular_interface._state_to_id )
+
+            state_ids = np.arange( len(environment.states) )
+            np.testing.assert_array_equal( tabular_interface.get_state_ids( environment.states ), state_ids )
+            self.assertEqual( tabular_interface.get_states( state_ids ), environment.states )
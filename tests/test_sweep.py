@@ -0,0 +1,67 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from RLearning.sweep import run_sweep, load_results, sweep_jobs
+from RLearning.temporal_difference import SARSA
+from RLearning.monte_carlo import MonteCarlo
+from RLearning.environment import RandomDiscreteWalk
+
+sys.path.append( os.path.join(os.path.dirname(__file__), '..') )
+
+PARAM_GRID = { "interface__alpha": [0.1, 0.5], "eps": [0.0, 0.1] }
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree( self.output_dir )
+
+    def sweep(self, output_dir, n_jobs):
+        return run_sweep( SARSA, lambda: RandomDiscreteWalk( n_states=5 ), PARAM_GRID, output_dir,
+                          seeds=[0, 1], episodes=10, n_jobs=n_jobs )
+
+    def test_columns(self):
+        run = self.sweep( self.output_dir, n_jobs=2 )
+        self.assertEqual( len(run), 8 )
+
+        results = load_results( self.output_dir )
+        self.assertEqual( len(results["job_id"]), 8*10 )
+        self.assertEqual( sorted( set( results["interface__alpha"].tolist() ) ), [0.1, 0.5] )
+        for column in results.values():
+            self.assertEqual( len(column), 8*10 )
+
+    def test_resume(self):
+        self.sweep( self.output_dir, n_jobs=2 )
+        self.assertEqual( self.sweep( self.output_dir, n_jobs=2 ), [] )
+
+        job_ids = [ job[0] for job in sweep_jobs( SARSA, PARAM_GRID, [0, 1], 10 ) ]
+        os.remove( os.path.join( self.output_dir, job_ids[3]+".npz" ) )
+        self.assertEqual( self.sweep( self.output_dir, n_jobs=2 ), [ job_ids[3] ] )
+
+    def test_seeded_jobs(self):
+        serial_dir = os.path.join( self.output_dir, "serial" )
+        parallel_dir = os.path.join( self.output_dir, "parallel" )
+        self.sweep( serial_dir, n_jobs=1 )
+        self.sweep( parallel_dir, n_jobs=3 )
+
+        serial, parallel = load_results( serial_dir ), load_results( parallel_dir )
+        self.assertTrue( (serial["job_id"] == parallel["job_id"]).all() )
+        self.assertTrue( (serial["steps"] == parallel["steps"]).all() )
+        self.assertTrue( np.allclose( serial["return"], parallel["return"] ) )
+
+    def test_nested_jobs(self):
+        with self.assertRaises( ValueError ):
+            run_sweep( MonteCarlo, lambda: RandomDiscreteWalk( n_states=5 ), { "n_jobs": [2] }, self.output_dir,
+                       episodes=10, n_jobs=2 )
+        self.assertEqual( os.listdir( self.output_dir ), [] )
+
+        # Running the jobs in this process, the methods can use their own pools
+        run = run_sweep( MonteCarlo, lambda: RandomDiscreteWalk( n_states=5 ), { "n_jobs": [2] }, self.output_dir,
+                         seeds=[0, 1], episodes=10, n_jobs=1 )
+        self.assertEqual( len(run), 2 )